@@ -4,7 +4,7 @@ from azure.identity import DefaultAzureCredential
 from dotenv import load_dotenv
 from semantic_kernel.contents.chat_history import ChatHistory
 
-from .database import SQLDatabase, VectorDatabase
+from .database import LocalVectorDatabase, SQLDatabase, VectorDatabase
 from .kernel import Kernel
 from .utils import SYSTEM_MESSAGE, get_logger, CONFIG
 
@@ -38,7 +38,11 @@ async def kernel_setup():
     database_service.setup()
 
     # Setup the vector database for RAG
-    vector_db = VectorDatabase(
+    if CONFIG["vector_backend"] == "local":
+        vector_db_class = LocalVectorDatabase
+    else:
+        vector_db_class = VectorDatabase
+    vector_db = vector_db_class(
         config=CONFIG,
         search_index=aisearch_index_name,
         conn_str=conn_str,
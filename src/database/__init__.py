@@ -1,2 +1,3 @@
 from .service import SQLDatabase
 from .vector_db import VectorDatabase
+from .local_vector_db import LocalVectorDatabase
@@ -0,0 +1,280 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from .vector_db import VectorDatabase
+from ..utils import get_logger
+
+logger = get_logger(__name__)
+
+# Reciprocal Rank Fusion constant, as used by Azure AI Search for hybrid queries
+RRF_K = 60
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _tokenize(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+class LocalIndex:
+    """
+    A search index stored on disk: the documents in a JSON file and their
+    normalized embeddings in a memory-mapped float32 matrix.
+    Vector search is an exact cosine top-k, keyword search a BM25 scorer over the
+    searchable fields, and hybrid results are merged with Reciprocal Rank Fusion.
+    """
+
+    def __init__(self, path: str, searchable_fields: list[str]) -> None:
+        self.path = path
+        self.searchable_fields = searchable_fields
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def _documents_path(self) -> str:
+        return os.path.join(self.path, "documents.json")
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    def _load(self) -> None:
+        self.documents, self.vectors = [], np.zeros((0, 0), dtype=np.float32)
+        if os.path.exists(self._documents_path):
+            with open(self._documents_path, "r") as f:
+                data = json.load(f)
+            self.documents = data["documents"]
+            if self.documents:
+                self.vectors = np.memmap(
+                    self._vectors_path,
+                    dtype=np.float32,
+                    mode="r",
+                    shape=(len(self.documents), data["dimensions"]),
+                )
+        self.rows = {doc["id"]: row for row, doc in enumerate(self.documents)}
+        self._build_keyword_index()
+
+    def _save(self, documents: list[dict], vectors: np.ndarray) -> None:
+        """
+        Atomically replace the stored documents and vectors, then reload them.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        # release the current memory map before replacing the file
+        self.vectors = None
+        np.ascontiguousarray(vectors, dtype=np.float32).tofile(
+            self._vectors_path + ".tmp"
+        )
+        with open(self._documents_path + ".tmp", "w") as f:
+            json.dump({"dimensions": vectors.shape[1], "documents": documents}, f)
+        os.replace(self._vectors_path + ".tmp", self._vectors_path)
+        os.replace(self._documents_path + ".tmp", self._documents_path)
+        self._load()
+
+    def _build_keyword_index(self) -> None:
+        self.postings = defaultdict(dict)
+        self.doc_lengths = np.zeros(len(self.documents), dtype=np.float32)
+        for row, doc in enumerate(self.documents):
+            text = " ".join(
+                str(doc.get(field) or "") for field in self.searchable_fields
+            )
+            terms = Counter(_tokenize(text))
+            for term, count in terms.items():
+                self.postings[term][row] = count
+            self.doc_lengths[row] = sum(terms.values())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._save([], np.zeros((0, 0), dtype=np.float32))
+
+    def upsert(self, documents: list[dict]) -> int:
+        """
+        Add documents to the index, replacing the documents with the same id.
+        """
+        if not documents:
+            return 0
+        with self._lock:
+            new_documents, new_vectors = list(self.documents), [self.vectors]
+            rows = dict(self.rows)
+            vectors = np.array(
+                [doc["contentVector"] for doc in documents], dtype=np.float32
+            )
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.maximum(norms, 1e-12)
+
+            replaced = {}
+            for doc, vector in zip(documents, vectors):
+                doc = {k: v for k, v in doc.items() if k != "contentVector"}
+                if doc["id"] in rows:
+                    row = rows[doc["id"]]
+                    new_documents[row] = doc
+                    replaced[row] = vector
+                else:
+                    rows[doc["id"]] = len(new_documents)
+                    new_documents.append(doc)
+                    new_vectors.append(vector[None, :])
+
+            if not len(self.documents):
+                new_vectors = new_vectors[1:]
+            matrix = np.concatenate(new_vectors)
+            for row, vector in replaced.items():
+                matrix[row] = vector
+            self._save(new_documents, matrix)
+        return len(documents)
+
+    def delete(self, keys: list[str]) -> int:
+        with self._lock:
+            rows = {self.rows[key] for key in keys if key in self.rows}
+            if not rows:
+                return 0
+            keep = [row for row in range(len(self.documents)) if row not in rows]
+            documents = [self.documents[row] for row in keep]
+            vectors = np.asarray(self.vectors)[keep]
+            if not documents:
+                vectors = np.zeros((0, 0), dtype=np.float32)
+            self._save(documents, vectors)
+        return len(rows)
+
+    def file_ids(self, filename: str) -> list[str]:
+        return [doc["id"] for doc in self.documents if doc.get("file") == filename]
+
+    def _vector_ranking(
+        self, vector: list[float], k: int, mask: np.ndarray
+    ) -> np.ndarray:
+        query = np.asarray(vector, dtype=np.float32)
+        query /= max(np.linalg.norm(query), 1e-12)
+        scores = np.where(mask, self.vectors @ query, -np.inf)
+        k = min(k, int(mask.sum()))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def _keyword_ranking(self, text: str, k: int, mask: np.ndarray) -> np.ndarray:
+        n = len(self.documents)
+        scores = np.zeros(n, dtype=np.float32)
+        avg_length = max(float(self.doc_lengths.mean()), 1.0)
+        for term in set(_tokenize(text)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            rows = np.fromiter(postings.keys(), dtype=np.int64)
+            tf = np.fromiter(postings.values(), dtype=np.float32)
+            lengths = self.doc_lengths[rows] / avg_length
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths)
+            scores[rows] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        matches = np.flatnonzero(scores * mask)
+        return matches[np.argsort(-scores[matches])][:k]
+
+    def _filter_mask(self, filters: dict = None) -> np.ndarray:
+        """
+        Flag the documents whose fields equal all the filter values.
+        """
+        filters = {k: str(v) for k, v in (filters or {}).items() if v is not None}
+        return np.array(
+            [
+                all(str(doc.get(k)) == v for k, v in filters.items())
+                for doc in self.documents
+            ],
+            dtype=bool,
+        )
+
+    def search(
+        self,
+        search_text: str,
+        search_vector: list[float],
+        top: int,
+        filters: dict = None,
+    ):
+        """
+        Run a hybrid search, returning the `top` documents with their fused score.
+        Only the documents matching the field values of `filters` are searched.
+        """
+        if not self.documents:
+            return []
+
+        mask = self._filter_mask(filters)
+        fused = defaultdict(float)
+        rankings = [self._vector_ranking(search_vector, top, mask)]
+        if search_text:
+            rankings.append(self._keyword_ranking(search_text, top, mask))
+        for ranking in rankings:
+            for rank, row in enumerate(ranking):
+                fused[int(row)] += 1 / (RRF_K + rank + 1)
+
+        results = []
+        for row in sorted(fused, key=fused.get, reverse=True)[:top]:
+            doc = dict(self.documents[row])
+            doc["contentVector"] = self.vectors[row].tolist()
+            doc["@search.score"] = fused[row]
+            results.append(doc)
+        return results
+
+
+class LocalVectorDatabase(VectorDatabase):
+    """
+    VectorDatabase variant storing its index locally instead of in Azure AI Search.
+    Embeddings and text extraction still go through the AI project.
+    """
+
+    def _connect_search_index(self):
+        self.index = LocalIndex(
+            os.path.join(self.config["local_index_path"], self.search_index),
+            searchable_fields=["content", "title", "file"]
+            + (self.config["rag_entities"] or []),
+        )
+
+    def _connect_async_search_index(self):
+        # the local index is searched in-process, no client is needed
+        self.async_search_client = None
+
+    def list_index_names(self) -> list[str]:
+        path = self.config["local_index_path"]
+        if not os.path.isdir(path):
+            return []
+        return [
+            name
+            for name in os.listdir(path)
+            if os.path.isdir(os.path.join(path, name))
+        ]
+
+    def reset_index(self):
+        self.index.clear()
+        self.invalidate_cache()
+        logger.info(f"🗑️  Cleared local index '{self.search_index}'")
+
+    def upload_documents(self, documents: list[dict]) -> int:
+        return self.index.upsert(documents)
+
+    def delete_documents(self, document_keys: list[str]) -> int:
+        return self.index.delete(list(document_keys))
+
+    def get_file_ids(self, filename: str) -> list[str]:
+        return self.index.file_ids(filename)
+
+    def search(
+        self,
+        search_text: str,
+        search_vector: list[float],
+        top: int,
+        filters: dict = None,
+    ) -> list[dict]:
+        # validate the filters like the Azure backend
+        self.entity_filter(filters)
+        return self.index.search(search_text, search_vector, top, filters)
+
+    async def asearch(
+        self,
+        search_text: str,
+        search_vector: list[float],
+        top: int,
+        filters: dict = None,
+    ) -> list[dict]:
+        return self.search(search_text, search_vector, top, filters)
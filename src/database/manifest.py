@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import threading
+from typing import Iterable, Optional
+
+from ..utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class DocumentManifest:
+    """
+    A local record of which document ids each file has in a search index.
+    It is maintained when documents are uploaded or deleted, so that the documents
+    of a file can be found without querying the index.
+    """
+
+    def __init__(self, path: str, index_name: str) -> None:
+        self.index_name = index_name
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                index_name TEXT NOT NULL,
+                file TEXT NOT NULL,
+                id TEXT NOT NULL,
+                PRIMARY KEY (index_name, id)
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS documents_file ON documents (index_name, file)"
+        )
+        self.conn.commit()
+
+    def get(self, filename: str) -> Optional[list[str]]:
+        """
+        Return the ids recorded for a file, or None if the file is not recorded.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id FROM documents WHERE index_name = ? AND file = ?",
+                (self.index_name, filename),
+            ).fetchall()
+        return [row[0] for row in rows] or None
+
+    def add(self, documents: Iterable[dict]) -> None:
+        with self._lock:
+            self.conn.executemany(
+                """
+                INSERT OR REPLACE INTO documents (index_name, file, id)
+                VALUES (?, ?, ?)
+                """,
+                [(self.index_name, doc["file"], doc["id"]) for doc in documents],
+            )
+            self.conn.commit()
+
+    def discard(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            self.conn.executemany(
+                "DELETE FROM documents WHERE index_name = ? AND id = ?",
+                [(self.index_name, id) for id in ids],
+            )
+            self.conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM documents WHERE index_name = ?", (self.index_name,)
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import pyodbc
+
+from ..utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class ConnectionPool:
+    """
+    A bounded pool of database connections. pyodbc connections must not be used by
+    several threads at once, so each checked out connection is used exclusively.
+    Connections idle for more than `health_check_interval` seconds are checked with a
+    trivial query on checkout, and replaced if broken.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], pyodbc.Connection],
+        max_size: int,
+        timeout: float,
+        health_check_interval: float,
+    ) -> None:
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        # idle connections with the time they were last used, most recent last
+        self._idle = deque()
+        self._closed = False
+
+        self.size = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.replaced = 0
+
+    def acquire(self) -> pyodbc.Connection:
+        """
+        Check out a connection, waiting up to `timeout` seconds for a free one.
+        """
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(
+                f"No database connection available after {self.timeout}s "
+                f"({self.max_size} in use)"
+            )
+        wait = time.monotonic() - start
+
+        try:
+            conn = self._checkout()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        return conn
+
+    def _checkout(self) -> pyodbc.Connection:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The connection pool is closed")
+            conn, last_used = self._idle.pop() if self._idle else (None, None)
+
+        idle_time = time.monotonic() - last_used if conn is not None else 0.0
+        if idle_time > self.health_check_interval:
+            if not self._is_healthy(conn):
+                logger.debug("Replacing a broken database connection.")
+                self._discard(conn)
+                with self._lock:
+                    self.replaced += 1
+                conn = None
+
+        if conn is None:
+            conn = self.connect()
+            with self._lock:
+                self.size += 1
+        return conn
+
+    def release(self, conn: pyodbc.Connection, broken: bool = False) -> None:
+        """
+        Return a checked out connection to the pool, closing it if it is broken.
+        Any open transaction is rolled back, so that the next user of the connection
+        does not inherit it nor its locks.
+        """
+        if not broken:
+            try:
+                conn.rollback()
+            except pyodbc.Error:
+                broken = True
+
+        with self._lock:
+            self.in_use -= 1
+            keep = not broken and not self._closed
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+        if not keep:
+            self._discard(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[pyodbc.Connection]:
+        """
+        Check out a connection for the duration of the block. The connection is
+        closed instead of returned to the pool if the block raises a pyodbc error.
+        """
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except pyodbc.Error:
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def _is_healthy(self, conn: pyodbc.Connection) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _discard(self, conn: pyodbc.Connection) -> None:
+        with self._lock:
+            self.size -= 1
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+    def stats(self) -> dict:
+        """
+        Pool metrics: connections open and in use, utilization, checkout count,
+        average and maximum checkout wait in seconds, and replaced connections.
+        """
+        with self._lock:
+            checkouts = max(self.checkouts, 1)
+            return {
+                "size": self.size,
+                "in_use": self.in_use,
+                "utilization": self.in_use / self.max_size,
+                "checkouts": self.checkouts,
+                "avg_wait": self.total_wait / checkouts,
+                "max_wait": self.max_wait,
+                "replaced": self.replaced,
+            }
+
+    def close(self) -> None:
+        """
+        Close the idle connections. Connections in use are closed when released.
+        """
+        with self._lock:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            self._discard(conn)
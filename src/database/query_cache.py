@@ -0,0 +1,68 @@
+import re
+import threading
+from typing import Optional
+
+from .result import QueryResult
+from ..utils.cache import TTLCache
+
+# single-quoted string literals, with '' escapes
+LITERAL = re.compile(r"('(?:[^']|'')*')")
+WRITE = re.compile(
+    r"\b(?:insert|update|delete|merge|create|alter|drop|truncate|exec|execute|into)\b"
+)
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Lowercase a query and collapse its whitespace, except in string literals, so
+    that formatting differences do not change the cache key.
+    """
+    parts = LITERAL.split(query.strip().rstrip(";"))
+    # odd parts are the string literals
+    return "".join(
+        part if i % 2 else re.sub(r"\s+", " ", part.lower())
+        for i, part in enumerate(parts)
+    ).strip()
+
+
+def is_write(query: str) -> bool:
+    """
+    Whether a normalized query may modify the database.
+    """
+    return WRITE.search(" ".join(LITERAL.split(query)[::2])) is not None
+
+
+class QueryCache:
+    """
+    A TTL cache of query results keyed by normalized SQL text. Each result is
+    stored with the version of the data it was read from, and only served while the
+    data is at that version.
+    """
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.cache = TTLCache(max_entries, ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, version: str) -> Optional[QueryResult]:
+        entry = self.cache.get(key)
+        with self._lock:
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        return None
+
+    def set(self, key: str, version: str, result: QueryResult) -> None:
+        self.cache.set(key, (version, result))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = max(self.hits + self.misses, 1)
+            return {
+                "entries": len(self.cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups,
+            }
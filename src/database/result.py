@@ -0,0 +1,103 @@
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import List, Optional
+
+import pyodbc
+
+SEPARATOR = " | "
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return "NULL"
+    # keep each row on a single line
+    return str(value).replace("\n", " ")
+
+
+@dataclass
+class QueryResult:
+    """
+    The bounded result of a query: the first rows of the result set, and the
+    number of rows and the range of the numeric columns over all the rows read.
+    """
+
+    columns: List[str]
+    rows: List[tuple] = field(default_factory=list)
+    row_count: int = 0
+    # False if reading stopped before the end of the result set
+    complete: bool = True
+    # (min, max) of each numeric column
+    ranges: dict = field(default_factory=dict)
+    # number of rows affected by a statement returning no result set
+    affected: Optional[int] = None
+
+    @classmethod
+    def from_cursor(
+        cls,
+        cursor: pyodbc.Cursor,
+        max_rows: int,
+        max_bytes: int,
+        max_scan_rows: int,
+        fetch_size: int,
+    ) -> "QueryResult":
+        """
+        Stream the result set of an executed cursor with `fetchmany`. At most
+        `max_rows` rows and `max_bytes` bytes of text are kept. Rows beyond them are
+        only counted, up to `max_scan_rows` rows.
+        """
+        if cursor.description is None:
+            return cls(columns=[], affected=cursor.rowcount)
+
+        result = cls(columns=[column[0] for column in cursor.description])
+        size = len(result._format_row(result.columns).encode("utf-8"))
+        keep = True
+
+        while result.row_count < max_scan_rows:
+            batch = cursor.fetchmany(min(fetch_size, max_scan_rows - result.row_count))
+            if not batch:
+                return result
+            for row in batch:
+                row = tuple(row)
+                if keep:
+                    row_size = len(result._format_row(row).encode("utf-8")) + 1
+                    keep = len(result.rows) < max_rows and size + row_size <= max_bytes
+                    if keep:
+                        result.rows.append(row)
+                        size += row_size
+                result._update_ranges(row)
+            result.row_count += len(batch)
+
+        # stop reading, unless the result set ends exactly at the scan limit
+        result.complete = cursor.fetchone() is None
+        return result
+
+    def _update_ranges(self, row: tuple) -> None:
+        for name, value in zip(self.columns, row):
+            if _is_number(value):
+                low, high = self.ranges.get(name, (value, value))
+                self.ranges[name] = (min(low, value), max(high, value))
+
+    def _format_row(self, values) -> str:
+        return SEPARATOR.join(_format_value(value) for value in values)
+
+    @property
+    def truncated(self) -> bool:
+        return len(self.rows) < self.row_count or not self.complete
+
+    def __str__(self):
+        if self.affected is not None:
+            return f"{self.affected} rows affected"
+        lines = [self._format_row(self.columns)]
+        lines.extend(self._format_row(row) for row in self.rows)
+        if self.truncated:
+            count = f"{self.row_count}" if self.complete else f"over {self.row_count}"
+            lines.append(f"... showing {len(self.rows)} of {count} rows")
+            lines.extend(
+                f"{name}: min {low}, max {high}"
+                for name, (low, high) in self.ranges.items()
+            )
+        return "\n".join(lines)
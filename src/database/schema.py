@@ -41,5 +41,21 @@ class Table:
 class DatabaseSchema:
     tables: List[Table] = field(default_factory=list)
 
+    @classmethod
+    def from_dict(cls, data: dict) -> "DatabaseSchema":
+        """
+        Rebuild a schema from its `dataclasses.asdict` representation.
+        """
+        return cls(
+            tables=[
+                Table(
+                    name=table["name"],
+                    columns=[Column(**column) for column in table["columns"]],
+                    foreign_keys=[ForeignKey(**fk) for fk in table["foreign_keys"]],
+                )
+                for table in data["tables"]
+            ]
+        )
+
     def __str__(self):
         return "\n".join(str(table) for table in self.tables)
@@ -1,10 +1,26 @@
+import asyncio
+import json
+import os
+import numpy as np
 import pyodbc
 import time
+from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor
 from faker import Faker
+from typing import Optional
 
+from .pool import ConnectionPool
+from .query_cache import QueryCache, is_write, normalize_sql
+from .result import QueryResult
 from .schema import Column, DatabaseSchema, ForeignKey, Table
-from .utils import create_table, insert_record, table_exists
-from ..utils import get_logger
+from .utils import (
+    create_table,
+    generate_records,
+    insert_records,
+    make_value_pools,
+    table_exists,
+)
+from ..utils import CONFIG, get_logger
 
 logger = get_logger(__name__)
 
@@ -23,7 +39,12 @@ driver = "ODBC Driver 18 for SQL Server"
 
 class SQLDatabase:
     def __init__(
-        self, server_name: str, database_name: str, uname: str, pwd: str
+        self,
+        server_name: str,
+        database_name: str,
+        uname: str,
+        pwd: str,
+        config: dict = CONFIG,
     ) -> None:
         # token = credential.get_token(scope).token
         self.connection_string = connection_string_template.format(
@@ -33,7 +54,28 @@ class SQLDatabase:
             uname=uname,
             pwd=pwd,
         )
-        self.conn = self._get_connection()
+        self.config = config
+        # identifies the database in the schema cache
+        self.database_key = "{}/{}".format(server_name, database_name)
+        # (version, DatabaseSchema) of the last discovered schema
+        self._schema = None
+
+        # pyodbc connections are not thread-safe, concurrent queries each check out
+        # their own connection and run in a worker thread, off the event loop
+        self.pool = ConnectionPool(
+            self._get_connection,
+            max_size=config["sql_pool_size"],
+            timeout=config["sql_pool_timeout"],
+            health_check_interval=config["sql_health_check_interval"],
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=config["sql_pool_size"], thread_name_prefix="sql"
+        )
+        self.query_cache = QueryCache(
+            config["sql_cache_size"], config["sql_cache_ttl"]
+        )
+        # False once the data version could not be read, see `_data_version`
+        self._track_changes = True
 
     def _get_connection(self) -> pyodbc.Connection:
         # see https://learn.microsoft.com/en-us/azure/azure-sql/database/azure-sql-python-quickstart
@@ -62,171 +104,279 @@ class SQLDatabase:
         Set up the database by creating the table and inserting fake records.
         """
         logger.debug("Setting up the database.")
-        # Create a cursor object to execute SQL queries
-        self.cursor = self.conn.cursor()
-
-        if table_exists(self.cursor):
-            # skip if table already exists
-            return
-
-        logger.debug("Creating table.")
-        create_table(self.cursor)
-
-        # Create Faker object
-        fake = Faker()
-
-        logger.debug("Generating and inserting records.")
-        # Generate and insert 1,000 fake records
-        for i in range(1000):
-            insert_record(self.cursor, i, fake)
-
-        # Commit the changes and close the connection
-        self.conn.commit()
+        with self.pool.connection() as conn:
+            # Create a cursor object to execute SQL queries
+            cursor = conn.cursor()
+
+            if table_exists(cursor):
+                # skip if table already exists
+                cursor.close()
+                return
+
+            logger.debug("Creating table.")
+            create_table(cursor)
+
+            # Create Faker object
+            fake = Faker()
+            pools = make_value_pools(fake, self.config["seed_pool_size"])
+            rng = np.random.default_rng()
+
+            rows, batch_size = self.config["seed_rows"], self.config["seed_batch_size"]
+            logger.debug("Generating and inserting {} records.".format(rows))
+            start_time = time.monotonic()
+            for start in range(0, rows, batch_size):
+                records = generate_records(
+                    start, min(batch_size, rows - start), pools, rng
+                )
+                insert_records(cursor, records)
+                # Commit each batch to keep the transaction log small
+                conn.commit()
+            logger.debug(
+                "Inserted {} records in {:.1f}s.".format(
+                    rows, time.monotonic() - start_time
+                )
+            )
+            cursor.close()
 
         logger.debug("Database setup completed.")
 
     def discover(self) -> DatabaseSchema:
         """
-        Discovers the structure of the attached Database
+        Discovers the structure of the attached Database.
+        The schema is cached in memory and on disk, and read again from the catalog
+        only when the objects of the database changed.
         """
-        logger.debug("Discovering attached Database")
-        cursor = self.conn.cursor()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                version = self._schema_version(cursor)
+                if self._schema is None or self._schema[0] != version:
+                    self._schema = (version, self._load_schema(version, cursor))
+            finally:
+                cursor.close()
+        return self._schema[1]
+
+    def _schema_version(self, cursor: pyodbc.Cursor) -> str:
+        """
+        A version of the schema, changing whenever an object is created, altered or
+        dropped.
+        """
+        cursor.execute("SELECT COUNT(*), MAX(modify_date) FROM sys.objects")
+        count, modify_date = cursor.fetchone()
+        return "{}:{}".format(count, modify_date.isoformat())
 
-        # Get list of tables
-        cursor.execute(
-            """
-            SELECT TABLE_NAME
-            FROM INFORMATION_SCHEMA.TABLES
-            WHERE TABLE_TYPE = 'BASE TABLE'
-            """
-        )
-        tables = [row[0] for row in cursor.fetchall()]
+    def _load_schema(self, version: str, cursor: pyodbc.Cursor) -> DatabaseSchema:
+        """
+        Load the schema from the disk cache if it has the given version, else
+        discover it and update the disk cache.
+        """
+        path = self.config["schema_cache"]
+        cached = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    cached = json.load(f)
+                entry = cached.get(self.database_key)
+                if entry and entry["version"] == version:
+                    logger.debug("Loaded database schema from {}".format(path))
+                    return DatabaseSchema.from_dict(entry["schema"])
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                # an unreadable cache is a miss, and is overwritten below
+                logger.warning("Ignoring the schema cache {}: {}".format(path, e))
+                cached = {}
+
+        database_schema = self._discover(cursor)
+        if path:
+            cached[self.database_key] = {
+                "version": version,
+                "schema": asdict(database_schema),
+            }
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            # replace the file at once, workers may read it concurrently
+            tmp_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(tmp_path, "w") as f:
+                json.dump(cached, f)
+            os.replace(tmp_path, path)
+        return database_schema
 
-        # Get foreign key relationships
+    def _discover(self, cursor: pyodbc.Cursor) -> DatabaseSchema:
+        """
+        Read the tables, columns and keys of the database from its catalog views, in
+        a single query.
+        """
+        logger.debug("Discovering attached Database")
         cursor.execute(
             """
             SELECT
-                fk.name AS FK_name,
-                tp.name AS parent_table,
+                t.name AS table_name,
+                c.name AS column_name,
+                TYPE_NAME(c.system_type_id) AS data_type,
+                CASE WHEN pk.column_id IS NULL THEN 0 ELSE 1 END AS is_primary_key,
+                fk.name AS fk_name,
                 tr.name AS referenced_table
             FROM
-                sys.foreign_keys AS fk
-            INNER JOIN
-                sys.tables AS tp ON fk.parent_object_id = tp.object_id
+                sys.tables AS t
             INNER JOIN
-                sys.tables AS tr ON fk.referenced_object_id = tr.object_id
+                sys.columns AS c ON c.object_id = t.object_id
+            LEFT JOIN (
+                SELECT ic.object_id, ic.column_id
+                FROM sys.indexes AS i
+                INNER JOIN sys.index_columns AS ic
+                ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+                WHERE i.is_primary_key = 1
+            ) AS pk ON pk.object_id = t.object_id AND pk.column_id = c.column_id
+            LEFT JOIN
+                sys.foreign_key_columns AS fkc
+                ON fkc.parent_object_id = t.object_id
+                AND fkc.parent_column_id = c.column_id
+            LEFT JOIN
+                sys.foreign_keys AS fk ON fk.object_id = fkc.constraint_object_id
+            LEFT JOIN
+                sys.tables AS tr ON tr.object_id = fk.referenced_object_id
+            ORDER BY t.name, c.column_id
             """
         )
-        foreign_keys = cursor.fetchall()
 
-        # Retrieve columns and primary keys for each table
-        table_columns = {}
-        for table in tables:
-            cursor.execute(
-                """
-                SELECT COLUMN_NAME, DATA_TYPE
-                FROM INFORMATION_SCHEMA.COLUMNS
-                WHERE TABLE_NAME = ?
-                """,
-                (table,),
-            )
-            columns = cursor.fetchall()
-            table_columns[table] = [(row[0], row[1]) for row in columns]
-
-        # Retrieve primary keys for each table
-        primary_keys = {}
-        for table in tables:
-            cursor.execute(
-                """
-                SELECT kcu.COLUMN_NAME
-                FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS AS tc
-                JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE AS kcu
-                ON tc.CONSTRAINT_TYPE = 'PRIMARY KEY'
-                AND tc.CONSTRAINT_NAME = kcu.CONSTRAINT_NAME
-                WHERE kcu.TABLE_NAME = ?
-                """,
-                (table,),
-            )
-            pk_columns = cursor.fetchall()
-            primary_keys[table] = [row[0] for row in pk_columns]
-
-            # Create an instance of DatabaseSchema
-            database_schema = DatabaseSchema()
-
-            for table, columns in table_columns.items():
-                # Create a Table instance
-                table_instance = Table(name=table)
-
-                for column in columns:
-                    column_name = column[0]
-                    data_type = column[1]
-                    is_primary_key = (
-                        column_name in primary_keys[table]
-                        if table in primary_keys
-                        else False
+        # a column appears once per foreign key it belongs to, so the columns and
+        # foreign keys already added to each table are tracked
+        tables = {}
+        for row in cursor.fetchall():
+            if row.table_name not in tables:
+                tables[row.table_name] = (Table(name=row.table_name), set(), set())
+            table, columns, foreign_keys = tables[row.table_name]
+
+            if row.column_name not in columns:
+                columns.add(row.column_name)
+                table.columns.append(
+                    Column(
+                        name=row.column_name,
+                        data_type=row.data_type,
+                        is_primary_key=bool(row.is_primary_key),
                     )
-
-                    # Create a Column instance and add it to the table
-                    column_instance = Column(
-                        name=column_name,
-                        data_type=data_type,
-                        is_primary_key=is_primary_key,
-                    )
-                    table_instance.columns.append(column_instance)
-
-                # Add the populated Table instance to the DatabaseSchema
-                database_schema.tables.append(table_instance)
-
-        # Populate foreign keys
-        for fk in foreign_keys:
-            fk_name = fk.FK_name
-            parent_table = fk.parent_table
-            referenced_table = fk.referenced_table
-
-            # Find the corresponding table instance and add the foreign key
-            for table in database_schema.tables:
-                if table.name == parent_table:
-                    foreign_key_instance = ForeignKey(
-                        name=fk_name,
-                        parent_table=parent_table,
-                        referenced_table=referenced_table,
+                )
+            if row.fk_name is not None and row.fk_name not in foreign_keys:
+                foreign_keys.add(row.fk_name)
+                table.foreign_keys.append(
+                    ForeignKey(
+                        name=row.fk_name,
+                        parent_table=row.table_name,
+                        referenced_table=row.referenced_table,
                     )
-                    table.foreign_keys.append(foreign_key_instance)
+                )
 
+        database_schema = DatabaseSchema(
+            tables=[table for table, _, _ in tables.values()]
+        )
         logger.debug(
             "Successfully discovered attached database: {}".format(database_schema)
         )
 
         return database_schema
 
-    def query(self, query: str) -> list[pyodbc.Row]:
+    def query(self, query: str) -> QueryResult:
         """
-        Query the database with the given SQL query.
+        Query the database with the given SQL query. The result set is streamed and
+        only its first rows are kept, within the `sql_max_rows` and
+        `sql_max_result_bytes` limits, so that a large result set does not fill the
+        memory or the prompt. Changes made by the query are rolled back.
+        Results of read queries are cached by normalized query text, and only served
+        while the data of the database is unchanged, see `_data_version`.
         """
-        cursor = self.conn.cursor()
-        try:
-            logger.debug("Querying database with: {}.".format(query))
-            cursor.execute(query)
-            result = cursor.fetchall()
-            logger.debug("Successfully queried database: {}.".format(result))
-        except Exception as ex:
+        key = normalize_sql(query)
+        # write statements are rolled back, their results are not worth caching
+        cacheable = not is_write(key)
+
+        for attempt in range(2):
             try:
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+                    try:
+                        # read before the query runs, so that a change made while
+                        # it runs invalidates its result
+                        version = self._data_version(cursor) if cacheable else None
+                        result = None
+                        if version is not None:
+                            result = self.query_cache.get(key, version)
+                        if result is not None:
+                            logger.debug(
+                                "Serving cached result for: {}.".format(query)
+                            )
+                            return result
+                        logger.debug("Querying database with: {}.".format(query))
+                        cursor.execute(query)
+                        result = QueryResult.from_cursor(
+                            cursor,
+                            max_rows=self.config["sql_max_rows"],
+                            max_bytes=self.config["sql_max_result_bytes"],
+                            max_scan_rows=self.config["sql_max_scan_rows"],
+                            fetch_size=self.config["sql_fetch_size"],
+                        )
+                    finally:
+                        cursor.close()
+                        # queries are not allowed to modify the database, roll back
+                        # any change they made
+                        conn.rollback()
+                if version is not None and result.affected is None:
+                    self.query_cache.set(key, version, result)
                 logger.debug(
-                    "Error querying database: {}. Trying to reconnect.".format(ex)
+                    "Successfully queried database: {} rows.".format(result.row_count)
                 )
-                self.conn = self._get_connection()
-                cursor = self.conn.cursor()
-                cursor.execute(query)
-                result = cursor.fetchall()
-                logger.debug("Successfully queried database: {}.".format(result))
+                return result
             except Exception as ex:
+                if attempt == 0 and isinstance(ex, pyodbc.Error):
+                    # the connection was discarded, retry with a new one
+                    logger.debug(
+                        "Error querying database: {}. Trying to reconnect.".format(ex)
+                    )
+                    continue
                 logger.error("Error querying database: {}.".format(ex))
                 return "No Result Found"
-        finally:
-            cursor.close()
 
-        return result
+    def _data_version(self, cursor: pyodbc.Cursor) -> Optional[str]:
+        """
+        A version of the data of the database, changing whenever a table is written
+        to: the change tracking version, if enabled, and the time of the last write
+        to an index or heap. Returns None if it cannot be read, e.g. without the VIEW
+        DATABASE STATE permission, and results are then not cached.
+        """
+        if not self._track_changes:
+            return None
+        try:
+            cursor.execute(
+                """
+                SELECT
+                    CHANGE_TRACKING_CURRENT_VERSION(),
+                    (
+                        SELECT MAX(last_user_update)
+                        FROM sys.dm_db_index_usage_stats
+                        WHERE database_id = DB_ID()
+                    )
+                """
+            )
+            tracking_version, last_update = cursor.fetchone()
+        except pyodbc.Error as e:
+            logger.warning("Cannot read the data version, not caching: {}".format(e))
+            self._track_changes = False
+            return None
+        return "{}:{}".format(tracking_version, last_update)
+
+    async def aquery(self, query: str) -> QueryResult:
+        """
+        Asynchronous variant of `query`, run in a worker thread so that concurrent
+        queries do not block the event loop nor each other.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.query, query)
+
+    async def adiscover(self) -> DatabaseSchema:
+        """
+        Asynchronous variant of `discover`, run in a worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.discover)
 
     def close(self):
-        self.cursor.close()
-        self.conn.close()
+        logger.debug("Closing database connection pool: {}.".format(self.pool.stats()))
+        logger.debug("Query cache: {}.".format(self.query_cache.stats()))
+        self.executor.shutdown(wait=True)
+        self.pool.close()
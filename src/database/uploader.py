@@ -0,0 +1,128 @@
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator
+
+from azure.search.documents import SearchClient
+
+from ..utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class DocumentUploader:
+    """
+    Sends documents to a search index in batches bounded by both a document count
+    and a payload size, with several batches in flight at once.
+    Documents rejected in a partially successful batch are retried on their own.
+    """
+
+    def __init__(self, search_client: SearchClient, config: dict, key: str = "id"):
+        self.search_client = search_client
+        self.key = key
+        self.max_batch_size = config["upload_batch_size"]
+        self.max_batch_bytes = config["upload_max_bytes"]
+        self.max_workers = config["upload_max_workers"]
+        self.max_retries = config["upload_max_retries"]
+
+    def upload(self, documents: Iterable[dict]) -> list[str]:
+        """
+        Upload documents to the index, returning the keys of the documents indexed.
+        """
+        return self._run(self.search_client.upload_documents, documents, "Uploaded")
+
+    def delete(self, keys: Iterable[str]) -> list[str]:
+        """
+        Delete documents from the index by key, returning the keys deleted.
+        """
+        return self._run(
+            self.search_client.delete_documents,
+            ({self.key: key} for key in keys),
+            "Deleted",
+        )
+
+    def _batches(self, documents: Iterable[dict]) -> Iterator[tuple[list[dict], int]]:
+        """
+        Group documents into batches, yielding each batch with its payload size.
+        """
+        batch, batch_bytes = [], 0
+        for document in documents:
+            size = len(json.dumps(document))
+            if batch and (
+                len(batch) >= self.max_batch_size
+                or batch_bytes + size > self.max_batch_bytes
+            ):
+                yield batch, batch_bytes
+                batch, batch_bytes = [], 0
+            batch.append(document)
+            batch_bytes += size
+        if batch:
+            yield batch, batch_bytes
+
+    def _send(self, method: Callable, batch: list[dict]) -> tuple[list[str], int]:
+        """
+        Send a batch, retrying the failed documents only.
+        Returns the keys of the documents that succeeded and the number that failed.
+        """
+        succeeded = []
+        for i in range(self.max_retries + 1):
+            try:
+                results = method(batch)
+            except Exception as e:
+                if i == self.max_retries:
+                    logger.error(f"⚠️ Failed to index {len(batch)} documents: {e}")
+                    return succeeded, len(batch)
+                logger.debug(f"Indexing batch failed: {e}. Retrying.")
+                time.sleep(2**i)
+                continue
+
+            failed_keys = {result.key for result in results if not result.succeeded}
+            succeeded.extend(
+                doc[self.key] for doc in batch if doc[self.key] not in failed_keys
+            )
+            if not failed_keys:
+                return succeeded, 0
+
+            batch = [doc for doc in batch if doc[self.key] in failed_keys]
+            if i < self.max_retries:
+                logger.debug(f"{len(batch)} documents were rejected. Retrying.")
+                time.sleep(2**i)
+
+        logger.error(
+            f"⚠️ Failed to index {len(batch)} documents: {sorted(failed_keys)}"
+        )
+        return succeeded, len(batch)
+
+    def _run(
+        self, method: Callable, documents: Iterable[dict], verb: str
+    ) -> list[str]:
+        start = time.perf_counter()
+        succeeded = []
+        failed = total_bytes = 0
+
+        def collect(futures):
+            nonlocal failed
+            for future in futures:
+                ok, ko = future.result()
+                succeeded.extend(ok)
+                failed += ko
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = set()
+            for batch, batch_bytes in self._batches(documents):
+                total_bytes += batch_bytes
+                pending.add(executor.submit(self._send, method, batch))
+                # bound the number of batches held in memory
+                if len(pending) >= 2 * self.max_workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+            collect(wait(pending).done)
+
+        elapsed = max(time.perf_counter() - start, 1e-6)
+        logger.info(
+            f"⏱️ {verb} {len(succeeded)} documents ({failed} failed, "
+            f"{total_bytes / 1e6:.1f} MB) in {elapsed:.1f}s: "
+            f"{len(succeeded) / elapsed:.0f} docs/s, "
+            f"{total_bytes / 1e6 / elapsed:.1f} MB/s"
+        )
+        return succeeded
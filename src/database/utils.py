@@ -1,3 +1,6 @@
+import datetime
+
+import numpy as np
 import pyodbc
 from faker import Faker
 
@@ -43,27 +46,67 @@ CREATE TABLE ExplorationProduction (
     cursor.execute(query)
 
 
-def insert_record(cursor: pyodbc.Cursor, i: int, fake: Faker) -> None:
-    """
-    Insert a fake record into the ExplorationProduction table.g
-    """
-    well_id = i + 1
-    well_name = fake.word() + ' Well'
-    location = fake.city() + ', ' + fake.country()
-    production_date = fake.date_between(start_date='-1y', end_date='today')
-    production_volume = fake.pydecimal(left_digits=6, right_digits=2, positive=True)
-    operator = fake.company()
-    field_name = fake.word() + ' Field'
-    reservoir = fake.word() + ' Reservoir'
-    depth = fake.pydecimal(left_digits=5, right_digits=2, positive=True)
-    api_gravity = fake.pydecimal(left_digits=2, right_digits=2, positive=True)
-    water_cut = fake.pydecimal(left_digits=2, right_digits=2)
-    gas_oil_ratio = fake.pydecimal(left_digits=4, right_digits=2)
-
-    query = '''
+INSERT_QUERY = '''
 INSERT INTO ExplorationProduction (WellID, WellName, Location, ProductionDate, ProductionVolume, Operator, FieldName, Reservoir, Depth, APIGravity, WaterCut, GasOilRatio) 
 VALUES (?,?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
 '''
 
-    # Insert record into the ExplorationProduction table
-    cursor.execute(query, well_id,well_name, location, production_date, production_volume, operator, field_name, reservoir, depth, api_gravity, water_cut, gas_oil_ratio)
+
+def make_value_pools(fake: Faker, size: int) -> dict:
+    """
+    Generate pools of fake text values, sampled from when generating records.
+    Calling Faker once per pool entry instead of once per record field keeps the
+    generation cost independent of the number of records.
+    """
+    generators = {
+        'well_name': lambda: fake.word() + ' Well',
+        'location': lambda: fake.city() + ', ' + fake.country(),
+        'operator': fake.company,
+        'field_name': lambda: fake.word() + ' Field',
+        'reservoir': lambda: fake.word() + ' Reservoir',
+    }
+    pools = {
+        name: np.array([generate() for _ in range(size)], dtype=object)
+        for name, generate in generators.items()
+    }
+    # production dates within the last year
+    today = datetime.date.today()
+    pools['production_date'] = np.array(
+        [today - datetime.timedelta(days=d) for d in range(366)], dtype=object
+    )
+    return pools
+
+
+def generate_records(
+    start: int, count: int, pools: dict, rng: np.random.Generator
+) -> list[tuple]:
+    """
+    Generate `count` fake ExplorationProduction records with ids from `start` + 1.
+    """
+    def sample(pool):
+        return pools[pool][rng.integers(0, len(pools[pool]), count)]
+
+    columns = [
+        range(start + 1, start + count + 1),
+        sample('well_name'),
+        sample('location'),
+        sample('production_date'),
+        np.round(rng.uniform(0, 1e6, count), 2).tolist(),
+        sample('operator'),
+        sample('field_name'),
+        sample('reservoir'),
+        np.round(rng.uniform(0, 1e5, count), 2).tolist(),
+        np.round(rng.uniform(0, 100, count), 2).tolist(),
+        np.round(rng.uniform(-100, 100, count), 2).tolist(),
+        np.round(rng.uniform(-1e4, 1e4, count), 2).tolist(),
+    ]
+    return list(zip(*columns))
+
+
+def insert_records(cursor: pyodbc.Cursor, records: list[tuple]) -> None:
+    """
+    Insert records into the ExplorationProduction table in a single round trip.
+    """
+    # send all parameter sets at once instead of one execute per record
+    cursor.fast_executemany = True
+    cursor.executemany(INSERT_QUERY, records)
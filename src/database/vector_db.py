@@ -1,11 +1,20 @@
+import asyncio
+import json
 import os
-import uuid
+import re
+from contextvars import ContextVar
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from azure.ai.projects import AIProjectClient
+from azure.ai.projects.aio import AIProjectClient as AsyncAIProjectClient
 from azure.ai.projects.models import ConnectionType
 from azure.identity import DefaultAzureCredential
+from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError
 from azure.search.documents import SearchClient
-from azure.search.documents.models import VectorizedQuery
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
+from azure.search.documents.models import VectorFilterMode, VectorizedQuery
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.indexes.models import (
     SemanticSearch,
@@ -25,13 +34,31 @@ from azure.search.documents.indexes.models import (
     ExhaustiveKnnParameters,
     VectorSearchProfile,
     SearchIndex,
+    ScalarQuantizationCompression,
+    ScalarQuantizationParameters,
+    BinaryQuantizationCompression,
+    RescoringOptions,
+    VectorSearchCompressionRescoreStorageMethod,
 )
 
+from .manifest import DocumentManifest
+from .uploader import DocumentUploader
 from ..utils import get_logger
+from ..utils.cache import EmbeddingCache, TTLCache, content_hash
 from ..rag import TextChunker
+from ..rag.diversify import mmr
 
 logger = get_logger(__name__)
 
+# Native output dimensions of the supported embedding models
+EMBEDDING_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+# Models trained so that their embeddings can be truncated to fewer dimensions
+TRUNCATABLE_MODELS = {"text-embedding-3-small", "text-embedding-3-large"}
+
 
 class VectorDatabase:
 
@@ -41,7 +68,28 @@ class VectorDatabase:
         self.text_chunker = TextChunker(config, conn_str, model)
         self.search_index = search_index
         self.config = config
+        self.conn_str = conn_str
         self.emb_model = emb_model
+        self.dimensions = embedding_dimensions(
+            emb_model, config["embedding_dimensions"]
+        )
+        # embeddings of a model truncated to fewer dimensions are cached separately
+        self.embedding_key = emb_model
+        if config["embedding_dimensions"]:
+            self.embedding_key = f"{emb_model}:{self.dimensions}"
+
+        self.embedding_cache = None
+        if config["embedding_cache"]:
+            self.embedding_cache = EmbeddingCache(
+                config["embedding_cache"], config["embedding_cache_max_entries"]
+            )
+        # query vectors and search results, results are dropped when the index changes
+        self.query_cache = TTLCache(
+            config["query_cache_size"], config["query_cache_ttl"]
+        )
+        self.result_cache = TTLCache(
+            config["query_cache_size"], config["result_cache_ttl"]
+        )
 
         # create a project client using environment variables loaded from the .env file
         self.project = AIProjectClient.from_connection_string(
@@ -55,6 +103,20 @@ class VectorDatabase:
         # create a vector embeddings client that will be used to generate vector embeddings
         self.embeddings = self.project.inference.get_embeddings_client()
 
+        self.manifest = None
+        self._connect_search_index()
+
+        # Asynchronous clients are created on first use, inside the running event loop
+        self.async_project = None
+        self._async_lock = asyncio.Lock()
+        # retrieval started ahead of time on a guessed query, see `speculate`. The
+        # database is shared by concurrent chats, so each one only sees its own.
+        self._speculation = ContextVar(f"speculation_{id(self)}", default=None)
+
+    def _connect_search_index(self):
+        """
+        Create the clients used to manage, fill and query the search index.
+        """
         # use the project client to get the default search connection
         self.search_connection = self.project.connections.get_default(
             connection_type=ConnectionType.AZURE_AI_SEARCH, include_credentials=True
@@ -69,7 +131,36 @@ class VectorDatabase:
         # Create a search index client using the search connection
         # This client will be used to retrieve documents
         self.search_client = SearchClient(
-            index_name=search_index,
+            index_name=self.search_index,
+            endpoint=self.search_connection.endpoint_url,
+            credential=AzureKeyCredential(key=self.search_connection.key),
+        )
+        # Batched, concurrent uploads and deletes through the search client
+        self.uploader = DocumentUploader(self.search_client, self.config)
+        # Local record of the document ids of each file, kept in sync on upload
+        self.manifest = DocumentManifest(
+            self.config["manifest_path"], self.search_index
+        )
+
+    async def _connect_async(self):
+        """
+        Create the asynchronous clients used by the retrieval coroutines.
+        """
+        async with self._async_lock:
+            if self.async_project is not None:
+                return
+            self.async_credential = AsyncDefaultAzureCredential()
+            project = AsyncAIProjectClient.from_connection_string(
+                conn_str=self.conn_str, credential=self.async_credential
+            )
+            self.async_embeddings = await project.inference.get_embeddings_client()
+            self._connect_async_search_index()
+            self.async_project = project
+
+    def _connect_async_search_index(self):
+        # This client will be used to retrieve documents without blocking the event loop
+        self.async_search_client = AsyncSearchClient(
+            index_name=self.search_index,
             endpoint=self.search_connection.endpoint_url,
             credential=AzureKeyCredential(key=self.search_connection.key),
         )
@@ -78,14 +169,17 @@ class VectorDatabase:
         """
         Create search index parameters and fields.
         """
-        dimensions = 1536  # text-embedding-ada-002
-        if self.emb_model == "text-embedding-3-large":
-            dimensions = 3072
-
         # The fields we want to index. The "embedding" field is a vector field that will
         # be used for vector search.
         fields = [
-            SimpleField(name="id", type=SearchFieldDataType.String, key=True),
+            SimpleField(
+                name="id",
+                type=SearchFieldDataType.String,
+                key=True,
+                # the ids of a file are paged through in key order
+                filterable=True,
+                sortable=True,
+            ),
             SearchableField(name="content", type=SearchFieldDataType.String),
             SimpleField(name="label", type=SearchFieldDataType.String),
             SearchableField(name="title", type=SearchFieldDataType.String),
@@ -94,18 +188,23 @@ class VectorDatabase:
             ),
             SearchField(
                 name="contentVector",
-                type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
+                type=SearchFieldDataType.Collection(self.config["vector_storage_type"]),
                 searchable=True,
-                # Size of the vector created by the text-embedding-ada-002 model.
-                vector_search_dimensions=dimensions,
-                vector_search_profile_name="myHnswProfile",
+                # Size of the vectors created by the embedding model
+                vector_search_dimensions=self.dimensions,
+                vector_search_profile_name=self.config["vector_search_profile"],
             ),
         ]
 
         if self.config["rag_entities"]:
             for entity_type in self.config["rag_entities"]:
                 fields.append(
-                    SearchableField(name=entity_type, type=SearchFieldDataType.String)
+                    SearchableField(
+                        name=entity_type,
+                        type=SearchFieldDataType.String,
+                        filterable=True,
+                        facetable=True,
+                    )
                 )
 
         # The "content" field should be prioritized for semantic ranking.
@@ -118,6 +217,9 @@ class VectorDatabase:
             ),
         )
 
+        compression = self.create_compression_definition()
+        compression_name = compression.compression_name if compression else None
+
         # For vector search, we want to use the HNSW (Hierarchical Navigable Small World)
         # algorithm (a type of approximate nearest neighbor search algorithm) with cosine
         # distance.
@@ -127,9 +229,7 @@ class VectorDatabase:
                     name="myHnsw",
                     kind=VectorSearchAlgorithmKind.HNSW,
                     parameters=HnswParameters(
-                        m=4,
-                        ef_construction=1000,
-                        ef_search=1000,
+                        **self.config["hnsw_parameters"],
                         metric=VectorSearchAlgorithmMetric.COSINE,
                     ),
                 ),
@@ -145,12 +245,14 @@ class VectorDatabase:
                 VectorSearchProfile(
                     name="myHnswProfile",
                     algorithm_configuration_name="myHnsw",
+                    compression_name=compression_name,
                 ),
                 VectorSearchProfile(
                     name="myExhaustiveKnnProfile",
                     algorithm_configuration_name="myExhaustiveKnn",
                 ),
             ],
+            compressions=[compression] if compression else None,
         )
 
         # Create the semantic settings with the configuration
@@ -164,44 +266,167 @@ class VectorDatabase:
             vector_search=vector_search,
         )
 
-    def create_docs_from_pdf(self, path: str) -> list[dict[str, any]]:
+    def create_compression_definition(self):
+        """
+        Create the vector compression configured by `vector_compression`, if any.
+        Compressed vectors are rescored with the original full precision vectors.
+        """
+        kind = self.config["vector_compression"]
+        if not kind:
+            return None
+
+        # keep the original vectors, they are used to rescore the candidates
+        storage_method = VectorSearchCompressionRescoreStorageMethod.PRESERVE_ORIGINALS
+        rescoring_options = RescoringOptions(
+            enable_rescoring=True,
+            default_oversampling=self.config["vector_oversampling"],
+            rescore_storage_method=storage_method,
+        )
+        if kind == "scalar":
+            return ScalarQuantizationCompression(
+                compression_name="myScalarQuantization",
+                rerank_with_original_vectors=None,
+                rescoring_options=rescoring_options,
+                parameters=ScalarQuantizationParameters(quantized_data_type="int8"),
+            )
+        if kind == "binary":
+            return BinaryQuantizationCompression(
+                compression_name="myBinaryQuantization",
+                rerank_with_original_vectors=None,
+                rescoring_options=rescoring_options,
+            )
+        raise ValueError(f"Unknown vector compression '{kind}'")
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Generate vector embeddings for a list of texts.
+        Texts already in the embedding cache are not sent again. The others are
+        sent in batches of `embedding_batch_size`, with at most
+        `embedding_max_workers` requests in flight. Embeddings are returned in the
+        same order as the input texts.
+        """
+        embeddings = [None] * len(texts)
+        if self.embedding_cache:
+            embeddings = self.embedding_cache.get_embeddings(self.embedding_key, texts)
+
+        # embed each missing text only once, even if it appears several times
+        missing = [t for t, e in zip(texts, embeddings) if e is None]
+        missing = list(dict.fromkeys(missing))
+        if missing:
+            computed = dict(zip(missing, self._embed_texts(missing)))
+            if self.embedding_cache:
+                self.embedding_cache.set_embeddings(
+                    self.embedding_key, missing, [computed[t] for t in missing]
+                )
+            embeddings = [
+                computed[t] if e is None else e for t, e in zip(texts, embeddings)
+            ]
+            logger.debug(
+                f"🧮 Embedded {len(missing)} texts, {len(texts) - len(missing)} from cache"
+            )
+
+        return embeddings
+
+    def _embed_texts(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed texts in batches, keeping several batch requests in flight.
+        """
+        batch_size = self.config["embedding_batch_size"]
+        batches = [
+            texts[i : i + batch_size] for i in range(0, len(texts), batch_size)
+        ]
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.config["embedding_max_workers"], len(batches))
+        ) as executor:
+            results = executor.map(self._embed_batch, batches)
+
+        return [embedding for batch in results for embedding in batch]
+
+    @property
+    def _requested_dimensions(self):
+        # only ask for a dimension count when embeddings are truncated
+        return None if self.embedding_key == self.emb_model else self.dimensions
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed a single batch of texts in one request.
+        """
+        response = self.embeddings.embed(
+            input=texts, model=self.emb_model, dimensions=self._requested_dimensions
+        )
+        # the service does not guarantee ordering, map results back via their index
+        items = sorted(response.data, key=lambda item: item.index)
+        return [item.embedding for item in items]
+
+    def create_docs_from_pdf(
+        self, path: str, skip_ids: set[str] = frozenset()
+    ) -> list[dict[str, any]]:
         """
         Create index entries from a pdf file.
+        Entries get a stable id derived from the file name, the chunk content and
+        the extracted metadata.
+        Entries whose id is in `skip_ids` are returned without being embedded.
         """
         filename = os.path.basename(path)
         chunks, metadatas = self.text_chunker.chunk_from_pdf(path)
-        items = []
+        if not isinstance(metadatas, dict):
+            metadatas = {}
+        items = {}
 
         for chunk in chunks:
-            id = str(uuid.uuid4())
-            emb = self.embeddings.embed(input=chunk, model=self.emb_model)
+            id = document_id(filename, chunk, metadatas)
             rec = {
                 "id": id,
                 "content": chunk,
                 # "label": "text",
                 "title": filename,
                 "file": filename,
-                "contentVector": emb.data[0].embedding,
             }
-            if isinstance(metadatas, dict):
-                rec.update(metadatas)
-            items.append(rec)
+            rec.update(metadatas)
+            # identical chunks of a file share the same id
+            items.setdefault(id, rec)
+
+        to_embed = [rec for id, rec in items.items() if id not in skip_ids]
+        embeddings = self.embed_documents([rec["content"] for rec in to_embed])
+        for rec, embedding in zip(to_embed, embeddings):
+            rec["contentVector"] = embedding
 
-        return items
+        return list(items.values())
 
     def add_to_index_from_pdf(self, pdf_file):
         """
         Add entries to the index from a pdf file.
+        If the file was already indexed, only new or changed chunks are uploaded and
+        chunks that no longer exist are deleted.
         """
-
-        # create documents from the pdf file, generating vector embeddings for the extracted chunks
-        docs = self.create_docs_from_pdf(path=pdf_file)
-
-        # Add the documents to the index using the Azure AI Search client
-        self.search_client.upload_documents(docs)
-        logger.info(f"➕ Uploaded {len(docs)} documents to '{self.search_index}' index")
+        filename = os.path.basename(pdf_file)
+        existing_ids = set(self.get_file_ids(filename))
+
+        # create documents from the pdf file, embedding only the new chunks
+        docs = self.create_docs_from_pdf(path=pdf_file, skip_ids=existing_ids)
+        new_docs = [doc for doc in docs if doc["id"] not in existing_ids]
+        stale_ids = existing_ids - {doc["id"] for doc in docs}
+
+        # Add the documents to the index
+        uploaded = self.upload_documents(new_docs) if new_docs else 0
+        deleted = self.delete_documents(stale_ids) if stale_ids else 0
+        self.invalidate_cache()
+        logger.info(
+            f"➕ Uploaded {uploaded} documents and deleted {deleted} "
+            f"stale documents of '{filename}' in '{self.search_index}' index"
+        )
 
     def create_index_from_pdf(self, pdf_file):
+        self.reset_index()
+        self.add_to_index_from_pdf(pdf_file)
+
+    def reset_index(self):
+        """
+        Replace the search index, if any, with an empty one.
+        """
         # If a search index already exists, delete it:
         index_names = self.list_index_names()
         if self.search_index in index_names:
@@ -213,20 +438,36 @@ class VectorDatabase:
         # create an empty search index
         index_definition = self.create_index_definition()
         self.index_client.create_index(index_definition)
+        self.manifest.clear()
+        self.invalidate_cache()
 
-        self.add_to_index_from_pdf(pdf_file)
+    def upload_documents(self, documents: list[dict]) -> int:
+        """
+        Upload documents to the index, returning the number of documents indexed.
+        """
+        uploaded = set(self.uploader.upload(documents))
+        # only record the documents actually indexed, so that the others are
+        # uploaded again on the next ingestion
+        self.manifest.add(doc for doc in documents if doc["id"] in uploaded)
+        return len(uploaded)
+
+    def delete_documents(self, document_keys: list[str]) -> int:
+        """
+        Delete documents from the index by id, returning the number deleted.
+        """
+        document_keys = list(document_keys)
+        deleted = self.uploader.delete(document_keys)
+        self.manifest.discard(deleted)
+        return len(deleted)
 
     def remove_from_index(self, pdf_file):
         """
         Remove from the index all entries from a pdf_file.
         """
         try:
-            # Search for documents with the given filename in the 'id' field
+            # Find the documents with the given filename
             filename = os.path.basename(pdf_file)
-            results = self.search_client.search(
-                search_text="*", filter=f"file eq '{filename}'", select=["id"]
-            )
-            document_keys = [doc["id"] for doc in results]
+            document_keys = self.get_file_ids(filename)
 
             if not document_keys:
                 logger.info(
@@ -234,55 +475,452 @@ class VectorDatabase:
                 )
                 return None
 
-            actions = [
-                {"@search.action": "delete", "id": doc_id} for doc_id in document_keys
-            ]
-
-            result = self.search_client.upload_documents(actions)
+            deleted = self.delete_documents(document_keys)
+            self.invalidate_cache()
             logger.info(
-                f"🗑️ Deleted {len(document_keys)} documents with filename '{filename}' from '{self.search_index}' index"
+                f"🗑️ Deleted {deleted} documents with filename '{filename}' from '{self.search_index}' index"
             )
-            return result
+            return deleted
         except Exception as e:
             logger.error(f"⚠️ Error deleting documents: {str(e)}")
             return None
 
-    def list_index_names(self) -> list[str]:
+    def get_file_ids(self, filename: str) -> list[str]:
         """
-        List all indexes of the index client.
+        List the ids of all index entries coming from the given file.
+        The ids are read from the manifest when the file is recorded there, otherwise
+        they are retrieved from the index page by page.
         """
-        return [index for index in self.index_client.list_index_names()]
+        document_keys = self.manifest.get(filename)
+        if document_keys is not None:
+            return document_keys
+
+        try:
+            document_keys = self._file_ids_in_key_order(filename)
+        except HttpResponseError as e:
+            # indexes created before the id field was filterable and sortable
+            logger.warning(
+                f"⚠️ Cannot page through ids in key order, recreate the index "
+                f"'{self.search_index}' to enable it: {e.message}"
+            )
+            document_keys = self._file_ids_by_offset(filename)
+
+        # record the file, so that the next lookups do not query the index
+        self.manifest.add({"file": filename, "id": id} for id in document_keys)
+        return document_keys
 
-    def get_documents(self, search_query: str, context: dict = None) -> dict:
+    def _file_ids_in_key_order(self, filename: str) -> list[str]:
         """
-        Search through the Search Index and retriev relevant documents.
+        Page through the ids of a file in key order: each page starts after the last
+        key of the previous one, which is stable while the index changes unlike
+        skipping over equally scored results.
         """
-        if context is None:
-            context = {}
+        page_size = self.config["search_page_size"]
+        document_keys = []
+        while True:
+            filter = f"file eq {odata_literal(filename)}"
+            if document_keys:
+                filter += f" and id gt {odata_literal(document_keys[-1])}"
+            results = self.search_client.search(
+                search_text="*",
+                filter=filter,
+                select=["id"],
+                order_by=["id asc"],
+                top=page_size,
+            )
+            page = [doc["id"] for doc in results]
+            document_keys.extend(page)
+            if len(page) < page_size:
+                return document_keys
 
-        overrides = context.get("overrides", {})
-        top = overrides.get("top", self.config["top_k"])
+    def _file_ids_by_offset(self, filename: str) -> list[str]:
+        """
+        Page through the ids of a file by skipping over the previous pages. Pages
+        are not stable, so duplicated ids are dropped.
+        """
+        page_size = self.config["search_page_size"]
+        document_keys = {}
+        offset = 0
+        while True:
+            results = self.search_client.search(
+                search_text="*",
+                filter=f"file eq {odata_literal(filename)}",
+                select=["id"],
+                top=page_size,
+                skip=offset,
+            )
+            page = [doc["id"] for doc in results]
+            document_keys.update(dict.fromkeys(page))
+            offset += len(page)
+            if len(page) < page_size:
+                return list(document_keys)
 
-        logger.debug(f"🧠 Intent mapping: {search_query}")
+    def invalidate_cache(self) -> None:
+        """
+        Drop cached search results, to be called whenever the index content changes.
+        """
+        self.result_cache.clear()
 
-        # generate a vector representation of the search query
-        embedding = self.embeddings.embed(model=self.emb_model, input=search_query)
-        search_vector = embedding.data[0].embedding
+    def embed_query(self, search_query: str) -> list[float]:
+        """
+        Generate a vector representation of a search query, using the query cache.
+        """
+        return self.embed_queries([search_query])[0]
 
+    def embed_queries(self, search_queries: list[str]) -> list[list[float]]:
+        """
+        Generate vector representations of search queries, using the query cache.
+        Queries missing from the cache are embedded together.
+        """
+        keys = [_normalize_query(query) for query in search_queries]
+        vectors = {key: self.query_cache.get(key) for key in keys}
+        missing = {key: query for key, query in zip(keys, search_queries)}
+        missing = {k: q for k, q in missing.items() if vectors[k] is None}
+
+        if missing:
+            embeddings = self.embed_documents(list(missing.values()))
+            for key, search_vector in zip(missing, embeddings):
+                vectors[key] = search_vector
+                self.query_cache.set(key, search_vector)
+        return [vectors[key] for key in keys]
+
+    def list_index_names(self) -> list[str]:
+        """
+        List all indexes of the index client.
+        """
+        return [index for index in self.index_client.list_index_names()]
+
+    def search(
+        self,
+        search_text: str,
+        search_vector: list[float],
+        top: int,
+        filters: dict = None,
+    ) -> list[dict]:
+        """
+        Run a hybrid (keyword and vector) search on the index, restricted to the
+        documents matching the entity filters, if any.
+        """
         # search the index for products matching the search query
         vector_query = VectorizedQuery(
             vector=search_vector, k_nearest_neighbors=top, fields="contentVector"
         )
 
         search_results = self.search_client.search(
-            search_text=search_query,
+            search_text=search_text,
             vector_queries=[vector_query],
             # select=["file", "content", "product_name"],
+            filter=self.entity_filter(filters),
+            vector_filter_mode=VectorFilterMode.PRE_FILTER,
             top=top,
         )
 
-        documents = [result for result in search_results]
+        return [result for result in search_results]
 
+    async def aembed_query(self, search_query: str) -> list[float]:
+        """
+        Asynchronous variant of `embed_query`.
+        """
+        return (await self.aembed_queries([search_query]))[0]
+
+    async def aembed_queries(self, search_queries: list[str]) -> list[list[float]]:
+        """
+        Asynchronous variant of `embed_queries`.
+        """
+        keys = [_normalize_query(query) for query in search_queries]
+        vectors = {key: self.query_cache.get(key) for key in keys}
+        missing = {key: query for key, query in zip(keys, search_queries)}
+        missing = {k: q for k, q in missing.items() if vectors[k] is None}
+
+        # the embedding cache is a SQLite database shared with ingestion threads,
+        # it is read and written in a worker thread
+        if missing and self.embedding_cache:
+            cached = await asyncio.to_thread(
+                self.embedding_cache.get_embeddings,
+                self.embedding_key,
+                list(missing.values()),
+            )
+            for key, search_vector in zip(list(missing), cached):
+                if search_vector is not None:
+                    vectors[key] = search_vector
+                    del missing[key]
+        if missing:
+            await self._connect_async()
+            response = await self.async_embeddings.embed(
+                input=list(missing.values()),
+                model=self.emb_model,
+                dimensions=self._requested_dimensions,
+            )
+            embeddings = [
+                item.embedding for item in sorted(response.data, key=lambda x: x.index)
+            ]
+            for key, search_vector in zip(missing, embeddings):
+                vectors[key] = search_vector
+            if self.embedding_cache:
+                await asyncio.to_thread(
+                    self.embedding_cache.set_embeddings,
+                    self.embedding_key,
+                    list(missing.values()),
+                    embeddings,
+                )
+
+        for key in keys:
+            self.query_cache.set(key, vectors[key])
+        return [vectors[key] for key in keys]
+
+    async def asearch(
+        self,
+        search_text: str,
+        search_vector: list[float],
+        top: int,
+        filters: dict = None,
+    ) -> list[dict]:
+        """
+        Asynchronous variant of `search`.
+        """
+        await self._connect_async()
+        vector_query = VectorizedQuery(
+            vector=search_vector, k_nearest_neighbors=top, fields="contentVector"
+        )
+        search_results = await self.async_search_client.search(
+            search_text=search_text,
+            vector_queries=[vector_query],
+            filter=self.entity_filter(filters),
+            vector_filter_mode=VectorFilterMode.PRE_FILTER,
+            top=top,
+        )
+        return [result async for result in search_results]
+
+    def get_documents(
+        self, search_query: str, context: dict = None, filters: dict = None
+    ) -> dict:
+        """
+        Search through the Search Index and retriev relevant documents.
+        `filters` restricts the search to the documents with the given entity
+        values, e.g. {"manufacturer": "BlackRock"}.
+        """
+        return self.get_documents_batch([search_query], context, filters)[0]
+
+    def get_documents_batch(
+        self, search_queries: list[str], context: dict = None, filters: dict = None
+    ) -> list[list[dict]]:
+        """
+        Retrieve the relevant documents of several search queries. The queries are
+        embedded in a single request and searched concurrently.
+        """
+        if context is None:
+            context = {}
+
+        top = context.get("overrides", {}).get("top", self.config["top_k"])
+        keys, results, missing = self._cached_results(search_queries, top, filters)
+
+        if missing:
+            # generate vector representations of the search queries
+            search_vectors = self.embed_queries(list(missing.values()))
+            with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                searches = executor.map(
+                    lambda q, v: self.search(
+                        q, v, self._candidate_count(top), filters
+                    ),
+                    missing.values(),
+                    search_vectors,
+                )
+                for key, search_vector, documents in zip(
+                    missing, search_vectors, searches
+                ):
+                    results[key] = self._diversify(documents, search_vector, top)
+                    self.result_cache.set(key, results[key])
+
+        return [
+            self._add_to_context(context, query, list(results[key]))
+            for query, key in zip(search_queries, keys)
+        ]
+
+    async def aget_documents(
+        self, search_query: str, context: dict = None, filters: dict = None
+    ) -> dict:
+        """
+        Asynchronous variant of `get_documents`, which does not block the event loop
+        while the query is embedded and searched.
+        """
+        return (await self.aget_documents_batch([search_query], context, filters))[0]
+
+    async def aget_documents_batch(
+        self, search_queries: list[str], context: dict = None, filters: dict = None
+    ) -> list[list[dict]]:
+        """
+        Asynchronous variant of `get_documents_batch`.
+        """
+        if context is None:
+            context = {}
+
+        top = context.get("overrides", {}).get("top", self.config["top_k"])
+        keys, results, missing = self._cached_results(search_queries, top, filters)
+
+        # the speculation is made without filters. Its documents were retrieved for
+        # another query of this chat only, so they are not cached under this one.
+        speculative = missing if self.entity_filter(filters) is None else {}
+        for key, query in list(speculative.items()):
+            documents = await self._speculative_result(query, top)
+            if documents is not None:
+                results[key] = documents
+                del missing[key]
+
+        if missing:
+            results.update(await self._aretrieve(missing, top, filters))
+
+        return [
+            self._add_to_context(context, query, list(results[key]))
+            for query, key in zip(search_queries, keys)
+        ]
+
+    async def _aretrieve(self, queries: dict, top: int, filters: dict = None) -> dict:
+        """
+        Embed and search queries given by cache key, caching and returning their
+        documents by cache key.
+        """
+        search_vectors = await self.aembed_queries(list(queries.values()))
+        searches = await asyncio.gather(
+            *(
+                self.asearch(
+                    query, search_vector, self._candidate_count(top), filters
+                )
+                for query, search_vector in zip(queries.values(), search_vectors)
+            )
+        )
+        results = {}
+        for key, search_vector, documents in zip(queries, search_vectors, searches):
+            results[key] = self._diversify(documents, search_vector, top)
+            self.result_cache.set(key, results[key])
+        return results
+
+    def speculate(self, search_query: str) -> tuple:
+        """
+        Start retrieving the documents of a likely search query in the background.
+        A later `aget_documents` call with a similar query, in the same context (e.g.
+        the same chat turn), is served from it instead of embedding and searching
+        again. Returns a handle to pass to `cancel_speculation`.
+        """
+        top = self.config["top_k"]
+        key = (_normalize_query(search_query), top, None)
+        task = asyncio.create_task(self._aretrieve({key: search_query}, top))
+        speculation = (_query_words(search_query), top, task)
+        self._speculation.set(speculation)
+        logger.debug(f"🔮 Speculative retrieval for: {search_query}")
+        return speculation
+
+    def cancel_speculation(self, speculation: tuple) -> None:
+        """
+        Drop a speculation started by `speculate`.
+        """
+        _, _, task = speculation
+        if task.done() and not task.cancelled():
+            # retrieve the exception of a failed speculation so it is not reported
+            task.exception()
+        task.cancel()
+        if self._speculation.get() is speculation:
+            self._speculation.set(None)
+
+    async def _speculative_result(self, search_query: str, top: int):
+        """
+        Return the speculative documents of the current context if they were
+        retrieved for a query similar enough to the given one, by Jaccard similarity
+        of their words, else None.
+        """
+        speculation = self._speculation.get()
+        if speculation is None:
+            return None
+        words, speculation_top, task = speculation
+        query_words = _query_words(search_query)
+        similarity = len(words & query_words) / max(len(words | query_words), 1)
+        if speculation_top != top or similarity < self.config["speculation_threshold"]:
+            return None
+
+        try:
+            documents = next(iter((await asyncio.shield(task)).values()))
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                # the caller itself is being cancelled
+                raise
+            logger.debug("Speculative retrieval was cancelled")
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️ Speculative retrieval failed: {e}")
+            return None
+        logger.debug(f"🔮 Serving speculative results for: {search_query}")
+        return documents
+
+    def _cached_results(
+        self, search_queries: list[str], top: int, filters: dict = None
+    ) -> tuple[list[tuple], dict, dict]:
+        """
+        Look up the cached results of search queries. Returns the cache key of each
+        query, the results by cache key (None when missing), and the distinct
+        queries left to search by cache key.
+        """
+        filter_key = self.entity_filter(filters)
+        keys = [(_normalize_query(q), top, filter_key) for q in search_queries]
+        results, missing = {}, {}
+        for query, key in zip(search_queries, keys):
+            logger.debug(f"🧠 Intent mapping: {query}")
+            if key in results:
+                continue
+            results[key] = self.result_cache.get(key)
+            if results[key] is None:
+                missing[key] = query
+            else:
+                logger.debug(f"♻️ Serving cached results for: {query}")
+        return keys, results, missing
+
+    def entity_filter(self, filters: dict = None) -> Optional[str]:
+        """
+        Build the OData filter matching documents with all the given entity values.
+        Filters with a None value are ignored.
+        """
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        unknown = set(filters) - set(self.config["rag_entities"] or [])
+        if unknown:
+            raise ValueError(f"Cannot filter on unknown entities: {sorted(unknown)}")
+        if not filters:
+            return None
+        return " and ".join(
+            f"{k} eq {odata_literal(str(v))}" for k, v in sorted(filters.items())
+        )
+
+    def _candidate_count(self, top: int) -> int:
+        """
+        Number of documents to retrieve to return `top` documents.
+        """
+        if self.config["diversify"]:
+            return max(top, self.config["mmr_fetch_k"])
+        return top
+
+    def _diversify(
+        self, documents: list[dict], search_vector: list[float], top: int
+    ) -> list[dict]:
+        """
+        Select `top` relevant but diverse documents among the retrieved candidates,
+        dropping near-duplicates, using the vectors returned with the documents.
+        """
+        if not self.config["diversify"] or len(documents) <= 1:
+            return documents[:top]
+        if any(doc.get("contentVector") is None for doc in documents):
+            logger.warning("⚠️ Retrieved documents have no vectors, cannot diversify")
+            return documents[:top]
+
+        selected = mmr(
+            search_vector,
+            [doc["contentVector"] for doc in documents],
+            top,
+            lambda_mult=self.config["mmr_lambda"],
+            dedup_threshold=self.config["dedup_threshold"],
+        )
+        logger.debug(f"🔀 Selected {len(selected)} of {len(documents)} candidates")
+        return [documents[i] for i in selected]
+
+    def _add_to_context(
+        self, context: dict, search_query: str, documents: list[dict]
+    ) -> list[dict]:
         # add results to the provided context
         if "thoughts" not in context:
             context["thoughts"] = []
@@ -307,3 +945,70 @@ class VectorDatabase:
 
     def close(self):
         self.project.close()
+        if self.embedding_cache:
+            self.embedding_cache.close()
+        if self.manifest:
+            self.manifest.close()
+
+    async def aclose(self):
+        """
+        Close the asynchronous clients, if they were created.
+        """
+        if self.async_project is None:
+            return
+        await self.async_embeddings.close()
+        if self.async_search_client:
+            await self.async_search_client.close()
+        await self.async_project.close()
+        await self.async_credential.close()
+        self.async_project = None
+
+
+def embedding_dimensions(emb_model: str, dimensions: int = None) -> int:
+    """
+    Return the dimension count of the embeddings of a model, optionally truncated.
+    """
+    native = EMBEDDING_DIMENSIONS.get(emb_model)
+    if dimensions is None:
+        if native is None:
+            logger.warning(
+                f"⚠️ Unknown embedding model '{emb_model}', assuming 1536 dimensions"
+            )
+            return 1536
+        return native
+    if emb_model not in TRUNCATABLE_MODELS or dimensions > native:
+        raise ValueError(
+            f"Embeddings of '{emb_model}' cannot have {dimensions} dimensions"
+        )
+    return dimensions
+
+
+def document_id(filename: str, content: str, metadata: dict = None) -> str:
+    """
+    Derive a stable index key from a file name, a chunk content and its metadata,
+    so that a chunk whose extracted entities changed gets a new key.
+    """
+    return content_hash(
+        filename, content, json.dumps(metadata or {}, sort_keys=True, default=str)
+    )
+
+
+def odata_literal(value: str) -> str:
+    """
+    Quote a string for use in an OData filter expression.
+    """
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _query_words(query: str) -> set[str]:
+    """
+    The set of lowercase words of a query, ignoring punctuation.
+    """
+    return set(re.findall(r"\w+", query.lower()))
+
+
+def _normalize_query(query: str) -> str:
+    """
+    Normalize case and whitespace so that near-identical queries share cache entries.
+    """
+    return " ".join(query.lower().split())
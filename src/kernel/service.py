@@ -104,6 +104,7 @@ class Kernel:
                 filters={
                     "included_functions": [
                         "plugins-rag_retrieve",
+                        "plugins-rag_retrieve_batch",
                         "plugins-discover_database",
                         "plugins-nlp_to_sql",
                         "plugins-sql_query",
@@ -119,13 +120,21 @@ class Kernel:
         """
         chat_history.add_user_message(user_input)
         chat_history_count = len(chat_history)
-        response = await self.chat_completion.get_chat_message_contents(
-            chat_history=chat_history,
-            settings=self.execution_settings,
-            kernel=self.kernel,
-            arguments=KernelArguments(settings=self.execution_settings),
-            model=self.model_name,
-        )
+        speculation = None
+        if self.vector_db.config["speculative_retrieval"]:
+            # most questions need the documents, retrieve them during the first call
+            speculation = self.vector_db.speculate(user_input)
+        try:
+            response = await self.chat_completion.get_chat_message_contents(
+                chat_history=chat_history,
+                settings=self.execution_settings,
+                kernel=self.kernel,
+                arguments=KernelArguments(settings=self.execution_settings),
+                model=self.model_name,
+            )
+        finally:
+            if speculation is not None:
+                self.vector_db.cancel_speculation(speculation)
 
         # print assistant/tool actions
         for message in chat_history[chat_history_count:]:
@@ -150,6 +159,7 @@ class Kernel:
     async def close(self):
         self.database_service.close()
         self.vector_db.close()
+        await self.vector_db.aclose()
         await self.project.close()
 
     async def stream_message(
@@ -1,8 +1,10 @@
-from typing import Annotated
+from typing import Annotated, Optional
 
 from semantic_kernel.functions.kernel_function_decorator import kernel_function
 
 from src.database import VectorDatabase
+from src.rag.packing import pack_context
+from src.rag.tokenizer import get_tokenizer
 from src.utils import get_logger
 
 logger = get_logger(__name__)
@@ -13,27 +15,94 @@ class RAGPlugin:
 
     def __init__(self, vector_db: VectorDatabase) -> None:
         self.vector_db = vector_db
+        self.tokenizer = get_tokenizer(vector_db.config["tokenizer"])
 
     @kernel_function(
         name="rag_retrieve",
         description="Retrieve relevant ETF investment information from key information documents based on the user's query. "
         "This includes ETF details such as product name, manufacturer, risk class, costs, and key content. "
-        "Use this function when the user asks about ETFs, investment options, risks, or costs.",
+        "Use this function when the user asks about ETFs, investment options, risks, or costs. "
+        "Pass a product name, manufacturer or risk class only to restrict the search to it.",
     )
-    def rag_retrieve(
+    async def rag_retrieve(
         self,
         query: Annotated[
             str,
             "A search query to retrieve documents from the search index based on the user query.",
         ],
+        product_name: Annotated[
+            Optional[str],
+            "Only search the documents of this exact product name, if given.",
+        ] = None,
+        manufacturer: Annotated[
+            Optional[str],
+            "Only search the documents of this exact manufacturer, if given. "
+            "Ignored if no document matches it exactly.",
+        ] = None,
+        risk_class: Annotated[
+            Optional[str],
+            "Only search the documents of this risk class (1 to 7), if given.",
+        ] = None,
     ) -> Annotated[
         str,
         "The context retrieved, containing relevant details from the ETF key information documents.",
     ]:
         logger.info("Running RAG retrieval with query: {}".format(query))
 
-        outputs = self.vector_db.get_documents(query)
-        context_keys = ["product_name", "manufacturer", "risk_class", "content"]
-        context = [{k: d[k] for k in context_keys if k in d} for d in outputs]
+        filters = {
+            "product_name": product_name,
+            "manufacturer": manufacturer,
+            "risk_class": risk_class,
+        }
+        outputs = await self.vector_db.aget_documents(query, filters=filters)
+        if not outputs and any(value is not None for value in filters.values()):
+            # the model guesses the entity values, which may not match the indexed
+            # ones exactly (e.g. "Vanguard" for "Vanguard Group (Ireland) Limited")
+            logger.info(
+                "No documents match the filters {}, ignoring them".format(filters)
+            )
+            outputs = await self.vector_db.aget_documents(query)
+        budget = self.vector_db.config["context_token_budget"]
+        context, tokens = pack_context(
+            outputs, self.vector_db.config["rag_entities"], self.tokenizer, budget
+        )
+        logger.info(
+            f"📦 Packed {tokens}/{budget} tokens from {len(outputs)} documents"
+        )
 
         return context
+
+    @kernel_function(
+        name="rag_retrieve_batch",
+        description="Retrieve relevant ETF investment information for several queries at once, "
+        "e.g. one query per ETF when comparing ETFs. "
+        "Prefer this function over multiple rag_retrieve calls when several searches are needed.",
+    )
+    async def rag_retrieve_batch(
+        self,
+        queries: Annotated[
+            list[str],
+            "Search queries to retrieve documents from the search index, one per information need.",
+        ],
+    ) -> Annotated[
+        str,
+        "The context retrieved for each query, from the ETF key information documents.",
+    ]:
+        logger.info("Running RAG retrieval with queries: {}".format(queries))
+
+        outputs = await self.vector_db.aget_documents_batch(queries)
+        # the token budget is shared evenly between the queries
+        budget = self.vector_db.config["context_token_budget"] // max(len(queries), 1)
+        sections, total = [], 0
+        for query, documents in zip(queries, outputs):
+            context, tokens = pack_context(
+                documents, self.vector_db.config["rag_entities"], self.tokenizer, budget
+            )
+            sections.append(f"### {query}\n{context}")
+            total += tokens
+        logger.info(
+            f"📦 Packed {total} tokens from {sum(map(len, outputs))} documents "
+            f"for {len(queries)} queries"
+        )
+
+        return "\n\n".join(sections)
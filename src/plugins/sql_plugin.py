@@ -1,6 +1,5 @@
-from typing import Annotated, List
+from typing import Annotated
 
-import pyodbc
 from semantic_kernel.functions.kernel_function_decorator import kernel_function
 
 from src.database.service import SQLDatabase
@@ -15,19 +14,26 @@ class SQLPlugin:
     def __init__(self, db: SQLDatabase) -> None:
         self.db = db
 
-    @kernel_function(name="sql_query", description="Query the database.")
-    def sql_query(
+    @kernel_function(
+        name="sql_query",
+        description="Query the database. Changes to the database are rolled back.",
+    )
+    async def sql_query(
         self, query: Annotated[str, "The SQL query"]
-    ) -> Annotated[List[pyodbc.Row], "The rows returned"]:
+    ) -> Annotated[
+        str,
+        "The rows returned, one per line after a header line with the column names, "
+        "with a summary of the rows left out if the result was truncated",
+    ]:
         logger.info("Running database plugin with query: {}".format(query))
-        return self.db.query(query)
+        return str(await self.db.aquery(query))
 
     @kernel_function(
         name="discover_database",
         description="Qiscover the tables and columns of the database",
     )
-    def discover_database(
+    async def discover_database(
         self,
     ) -> Annotated[str, "The structure of the Database"]:
         logger.info("Running the discover database tool")
-        return self.db.discover()
+        return str(await self.db.adiscover())
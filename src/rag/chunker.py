@@ -1,14 +1,20 @@
 import io
 import base64
 import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 
 from azure.ai.projects import AIProjectClient
 from azure.identity import DefaultAzureCredential
 from azure.ai.inference.prompts import PromptTemplate
 
-from src.utils import TEMPLATE_PATH
+from src.utils import TEMPLATE_PATH, get_logger
+from src.utils.cache import DiskCache, content_hash
+from .tokenizer import get_tokenizer
+
+logger = get_logger(__name__)
 
 
 class TextChunker:
@@ -16,6 +22,7 @@ class TextChunker:
     def __init__(self, config: dict, conn_str: str, model: str):
         self.config = config
         self.model = model
+        self.tokenizer = get_tokenizer(config["tokenizer"])
 
         self.project = AIProjectClient.from_connection_string(
             conn_str=conn_str,
@@ -25,77 +32,190 @@ class TextChunker:
         # create a chat client we can use for testing
         self.chat = self.project.inference.get_chat_completions_client()
 
-    def _token_len(self, chunk):
-        return len(chunk.split())
+        # parsed vision model outputs, keyed by page image, prompt template and model
+        self.ocr_cache = None
+        if config["ocr_cache"]:
+            self.ocr_cache = DiskCache(
+                config["ocr_cache"], config["ocr_cache_max_entries"]
+            )
 
     def recursive_chunking(self, texts):
+        """
+        Merge the separator-delimited blocks of the texts into chunks of at most
+        `max_chunk_size` tokens. Consecutive chunks share up to `chunk_overlap`
+        tokens of trailing blocks. Token counts are kept incrementally, so each block
+        is tokenized only once.
+        """
         separator = self.config["separator"]
         max_chunk_size = self.config["max_chunk_size"]
-        chunks, current_chunk = [], ""
+        overlap = self.config["chunk_overlap"]
+        joiner_size = self.tokenizer.count("\n")
 
-        for text in texts:
-            entries = text.split(separator)
+        chunks = []
+        # blocks of the current chunk, their token counts, and the chunk token count
+        entries, sizes, size = [], [], 0
 
-            for entry in entries:
-                if not current_chunk:
-                    current_chunk = entry
+        for text in texts:
+            for entry in text.split(separator):
+                if not entry.strip():
                     continue
-                if self._token_len(current_chunk + " " + entry) > max_chunk_size:
-                    chunks.append(current_chunk)
-                    current_chunk = entry
-                else:
-                    current_chunk += "\n" + entry
-
-        if current_chunk:
-            chunks.append(current_chunk)
+                entry_size = self.tokenizer.count(entry)
+
+                if entries and size + joiner_size + entry_size > max_chunk_size:
+                    chunks.append("\n".join(entries))
+
+                    # carry over the trailing blocks fitting in the overlap
+                    budget = min(overlap, max_chunk_size - entry_size - joiner_size)
+                    keep, kept_size = 0, 0
+                    while keep < len(entries):
+                        next_size = sizes[-1 - keep] + (joiner_size if keep else 0)
+                        if kept_size + next_size > budget:
+                            break
+                        kept_size += next_size
+                        keep += 1
+                    entries = entries[len(entries) - keep :]
+                    sizes = sizes[len(sizes) - keep :]
+                    size = kept_size
+
+                if entries:
+                    size += joiner_size
+                entries.append(entry)
+                sizes.append(entry_size)
+                size += entry_size
+
+        if entries:
+            chunks.append("\n".join(entries))
 
         return chunks
 
     def extract_images_from_pdf(self, input_path):
-        return convert_from_path(input_path)
+        """
+        Render the pages of a PDF file, `pdf_render_window` pages at a time.
+        Pages are yielded one by one so that the caller can release them once
+        processed, instead of holding the whole document in memory.
+        """
+        page_count = pdfinfo_from_path(input_path)["Pages"]
+        window = self.config["pdf_render_window"]
+
+        for first_page in range(1, page_count + 1, window):
+            pages = convert_from_path(
+                input_path,
+                dpi=self.config["pdf_dpi"],
+                first_page=first_page,
+                last_page=min(first_page + window - 1, page_count),
+            )
+            # hand over the pages without keeping a reference in this frame
+            pages.reverse()
+            while pages:
+                yield pages.pop()
+
+    def _extract_page(self, system_message, page, template):
+        """
+        Extract the text and the entities of a page image with the vision model.
+        Failed requests are retried up to `ocr_max_retries` times. Parsed outputs are
+        cached, so a page already seen with the same template and model is not sent
+        again.
+        """
+        img_byte_arr = io.BytesIO()
+        page.save(img_byte_arr, format="PNG")  # Change format if needed
+        # the rendered page is no longer needed once encoded
+        page.close()
+        image_bytes = img_byte_arr.getvalue()
+        del img_byte_arr
+
+        cache_key = content_hash(
+            image_bytes, template, self.config["separator"], self.model
+        )
+        if self.ocr_cache:
+            cached = self.ocr_cache.get(cache_key)
+            if cached is not None:
+                json_output = json.loads(cached)
+                return json_output.pop("content"), json_output
+
+        image_data = base64.b64encode(image_bytes).decode("utf-8")
+        del image_bytes
+
+        # Convert to Data URL format
+        image_format = "png"
+        data_url = f"data:image/{image_format};base64,{image_data}"
+
+        # Create the multimodal input
+        multimodal_input = {
+            "role": "user",
+            "content": [
+                {"type": "image_url", "image_url": {"url": data_url}},
+            ],
+        }
+
+        max_retries = self.config["ocr_max_retries"]
+        for i in range(max_retries + 1):
+            try:
+                response = self.chat.complete(
+                    model=self.model,
+                    messages=system_message + [multimodal_input],
+                )
+                break
+            except Exception as e:
+                if i == max_retries:
+                    raise
+                delay = self.config["ocr_retry_backoff"] * 2**i
+                logger.warning(
+                    "Page extraction failed: {}. Retrying in {}s ({}/{}).".format(
+                        e, delay, i + 1, max_retries
+                    )
+                )
+                time.sleep(delay)
+
+        output = response.choices[0].message.content
+        try:
+            json_output = json.loads(output)
+            text = json_output.pop("content")
+        except (json.JSONDecodeError, KeyError, AttributeError, TypeError):
+            logger.warning(f"Invalid JSON: {output}")
+            return output, {}
+
+        if self.ocr_cache:
+            self.ocr_cache.set(cache_key, output.encode("utf-8"))
+        return text, json_output
 
     def chunk_from_pdf(self, input_path):
-        pages = self.extract_images_from_pdf(input_path)
-
-        prompt_template = PromptTemplate.from_prompty(
-            Path(TEMPLATE_PATH) / self.config["template"]
-        )
+        template_path = Path(TEMPLATE_PATH) / self.config["template"]
+        template = template_path.read_text(encoding="utf-8")
+        prompt_template = PromptTemplate.from_prompty(template_path)
         system_message = prompt_template.create_messages(
             separator=self.config["separator"]
         )
 
+        # Pages are processed concurrently as they are rendered. At most
+        # `pdf_max_pages_in_memory` pages are alive at once: the render window plus
+        # the pages waiting for, or being processed by, the vision model.
+        max_pending = max(
+            1,
+            self.config["pdf_max_pages_in_memory"] - self.config["pdf_render_window"],
+        )
+        results, pending = {}, {}
+        with ThreadPoolExecutor(max_workers=self.config["ocr_max_workers"]) as executor:
+            for index, page in enumerate(self.extract_images_from_pdf(input_path)):
+                future = executor.submit(
+                    self._extract_page, system_message, page, template
+                )
+                pending[future] = index
+                del page
+
+                if len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results[pending.pop(future)] = future.result()
+
+            for future in wait(pending).done:
+                results[pending[future]] = future.result()
+
+        # merge the page results in the original page order
         texts, metadatas = [], {}
-        for page in pages:
-            img_byte_arr = io.BytesIO()
-            page.save(img_byte_arr, format="PNG")  # Change format if needed
-            image_data = base64.b64encode(img_byte_arr.getvalue()).decode("utf-8")
-
-            # Convert to Data URL format
-            image_format = "png"
-            data_url = f"data:image/{image_format};base64,{image_data}"
-
-            # Create the multimodal input
-            multimodal_input = {
-                "role": "user",
-                "content": [
-                    {"type": "image_url", "image_url": {"url": data_url}},
-                ],
-            }
-
-            response = self.chat.complete(
-                model=self.model,
-                messages=system_message + [multimodal_input],
-            )
-
-            try:
-                json_output = json.loads(response.choices[0].message.content)
-                texts.append(json_output.pop("content"))
-
-                for k, v in json_output.items():
-                    metadatas[k] = metadatas.get(k, v) or v
-
-            except:
-                texts.append(response.choices[0].message.content)
-                print(f"Invalid JSON: {json_output}")
+        for index in range(len(results)):
+            text, page_metadatas = results[index]
+            texts.append(text)
+            for k, v in page_metadatas.items():
+                metadatas[k] = metadatas.get(k, v) or v
 
         return self.recursive_chunking(texts), metadatas
@@ -0,0 +1,46 @@
+import numpy as np
+
+
+def mmr(
+    query_vector: list[float],
+    doc_vectors: list[list[float]],
+    top: int,
+    lambda_mult: float,
+    dedup_threshold: float = 1.0,
+) -> list[int]:
+    """
+    Select up to `top` documents by Maximal Marginal Relevance.
+    Each step picks the candidate maximizing
+    `lambda_mult * sim(query, doc) - (1 - lambda_mult) * max sim(doc, selected)`.
+    Candidates whose cosine similarity to an already selected document is at least
+    `dedup_threshold` are dropped as near-duplicates.
+    Returns the indices of the selected documents, in selection order.
+    """
+    if not doc_vectors:
+        return []
+
+    docs = np.asarray(doc_vectors, dtype=np.float32)
+    docs /= np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query /= max(np.linalg.norm(query), 1e-12)
+
+    relevance = docs @ query
+    similarity = docs @ docs.T
+
+    selected = []
+    # highest similarity of each candidate to the selected documents
+    redundancy = np.full(len(docs), -np.inf, dtype=np.float32)
+    available = np.ones(len(docs), dtype=bool)
+
+    while len(selected) < top and available.any():
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        scores = lambda_mult * relevance - (1 - lambda_mult) * penalty
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+        available &= redundancy < dedup_threshold
+
+    return selected
@@ -0,0 +1,58 @@
+import re
+from typing import Optional
+
+# split after sentence-ending punctuation followed by whitespace
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def truncate_sentences(text: str, tokenizer, budget: int) -> tuple[str, int]:
+    """
+    Keep the leading sentences of a text fitting in `budget` tokens.
+    Returns the truncated text and its token count, ("", 0) if no sentence fits.
+    """
+    size = tokenizer.count(text)
+    if size <= budget:
+        return text, size
+
+    kept, kept_size = [], 0
+    for sentence in SENTENCE_END.split(text):
+        sentence_size = tokenizer.count(sentence) + (1 if kept else 0)
+        if kept_size + sentence_size > budget:
+            break
+        kept.append(sentence)
+        kept_size += sentence_size
+    return " ".join(kept), kept_size
+
+
+def pack_context(
+    documents: list[dict], entity_keys: Optional[list[str]], tokenizer, budget: int
+) -> tuple[str, int]:
+    """
+    Pack retrieved documents into a context of at most `budget` tokens.
+    Documents are taken by decreasing search score. Each one is written as a header
+    line with its entity values followed by its content, truncated on a sentence
+    boundary if it does not fit entirely. Documents with no room left for a header
+    and a sentence are dropped.
+    Returns the context and its token count.
+    """
+    entity_keys = entity_keys or []
+    ranked = sorted(
+        documents, key=lambda doc: doc.get("@search.score") or 0.0, reverse=True
+    )
+
+    blocks, used = [], 0
+    for doc in ranked:
+        entities = [str(doc[k]) for k in entity_keys if doc.get(k)]
+        header = f"[{' | '.join(entities)}]" if entities else ""
+        # a blank line separates consecutive blocks, a newline the header
+        overhead = (2 if blocks else 0) + (tokenizer.count(header) + 1 if header else 0)
+
+        content, size = truncate_sentences(
+            doc.get("content", ""), tokenizer, budget - used - overhead
+        )
+        if not content:
+            continue
+        blocks.append(f"{header}\n{content}" if header else content)
+        used += overhead + size
+
+    return "\n\n".join(blocks), used
@@ -0,0 +1,50 @@
+import os
+
+from src.utils import CACHE_PATH, get_logger
+
+logger = get_logger(__name__)
+
+# tiktoken downloads its encodings once, keep them in the local cache so that later
+# runs work offline
+os.environ.setdefault("TIKTOKEN_CACHE_DIR", str(CACHE_PATH / "tiktoken"))
+
+
+class WhitespaceTokenizer:
+    """
+    Approximates tokens by whitespace-separated words.
+    """
+
+    def count(self, text: str) -> int:
+        return len(text.split())
+
+
+class TiktokenTokenizer:
+    """
+    Counts the tokens of an OpenAI encoding, e.g. "cl100k_base" which is used by the
+    text-embedding-ada-002 and text-embedding-3-* models.
+    """
+
+    def __init__(self, encoding: str) -> None:
+        import tiktoken
+
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+def get_tokenizer(name: str):
+    """
+    Return the tokenizer for the given name: "whitespace" or a tiktoken encoding.
+    If the encoding is not in the local cache and cannot be downloaded, e.g. on an
+    offline host, token counts are approximated by whitespace-separated words.
+    """
+    if name == "whitespace":
+        return WhitespaceTokenizer()
+    try:
+        return TiktokenTokenizer(name)
+    except Exception as e:
+        logger.warning(
+            f"⚠️ Cannot load the '{name}' encoding ({e}), counting words instead"
+        )
+        return WhitespaceTokenizer()
@@ -0,0 +1,168 @@
+import os
+import json
+import argparse
+
+import numpy as np
+
+from ..utils import CACHE_PATH, CONFIG, get_logger
+
+logger = get_logger(__name__)
+
+
+def load_vectors(vectors_file, json_file=None):
+    """
+    Load a dump of embedding vectors. If it does not exist yet, embed the chunks of
+    the json file with the configured embedding model (using the embedding cache)
+    and save them.
+    """
+    if os.path.exists(vectors_file):
+        return np.load(vectors_file)
+    if json_file is None:
+        raise FileNotFoundError(f"{vectors_file} not found, pass --file to create it")
+
+    from ..database import VectorDatabase
+
+    vector_db = VectorDatabase(
+        config=CONFIG,
+        search_index=os.environ["AISEARCH_INDEX_NAME"],
+        conn_str=os.environ["AIPROJECT_CONNECTION_STRING"],
+        model=os.environ["DEPLOYMENT_NAME"],
+        emb_model=os.environ["EMBEDDINGS_MODEL"],
+    )
+    with open(json_file, "r") as f:
+        texts = [data["Chunk"] for data in json.load(f)]
+    vectors = np.array(vector_db.embed_documents(texts), dtype=np.float32)
+    vector_db.close()
+
+    os.makedirs(os.path.dirname(os.path.abspath(vectors_file)), exist_ok=True)
+    np.save(vectors_file, vectors)
+    return vectors
+
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(base, queries, k):
+    """
+    Return the indices of the k highest scoring base vectors for each query.
+    """
+    scores = queries @ base.T
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def recall_at_k(found, truth):
+    hits = [len(set(f) & set(t)) for f, t in zip(found, truth)]
+    return float(np.mean(hits)) / truth.shape[1]
+
+
+def rescore(base, queries, candidates, k):
+    """
+    Rescore candidates with the full precision vectors, keeping the k best.
+    """
+    scores = np.einsum("qd,qcd->qc", queries, base[candidates])
+    order = np.argsort(-scores, axis=1)[:, :k]
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def scalar_quantize(vectors):
+    """
+    Quantize each dimension to int8 over its range, returning the decoded vectors.
+    """
+    low, high = vectors.min(axis=0), vectors.max(axis=0)
+    scale = np.maximum(high - low, 1e-12) / 255
+    codes = np.round((vectors - low) / scale).astype(np.uint8)
+    return codes * scale + low
+
+
+def binary_quantize(vectors):
+    """
+    Keep the sign of each dimension, returning +1/-1 vectors.
+    """
+    return np.where(vectors > 0, 1.0, -1.0).astype(np.float32)
+
+
+def benchmark(vectors, k, n_queries, oversampling, seed=0):
+    """
+    Compare compression schemes by vector index memory and recall@k against exact
+    full precision search. Held-out vectors are used as queries.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = normalize(vectors.astype(np.float32))
+    order = rng.permutation(len(vectors))
+    queries, base = vectors[order[:n_queries]], vectors[order[n_queries:]]
+    n, dims = base.shape
+    truth = top_k(base, queries, k)
+    n_candidates = min(int(k * oversampling), n)
+
+    rows = [("float32", 4 * dims, recall_at_k(truth, truth))]
+
+    half = base.astype(np.float16).astype(np.float32)
+    rows.append(("float16", 2 * dims, recall_at_k(top_k(half, queries, k), truth)))
+
+    scalar = scalar_quantize(base)
+    rows.append(("int8", dims, recall_at_k(top_k(scalar, queries, k), truth)))
+    candidates = top_k(scalar, queries, n_candidates)
+    rows.append(
+        (
+            f"int8 + rescoring x{oversampling:g}",
+            dims,
+            recall_at_k(rescore(base, queries, candidates, k), truth),
+        )
+    )
+
+    binary = binary_quantize(base)
+    rows.append(("binary", dims / 8, recall_at_k(top_k(binary, queries, k), truth)))
+    candidates = top_k(binary, queries, n_candidates)
+    rows.append(
+        (
+            f"binary + rescoring x{oversampling:g}",
+            dims / 8,
+            recall_at_k(rescore(base, queries, candidates, k), truth),
+        )
+    )
+
+    # text-embedding-3-* embeddings keep most of their information in the first
+    # dimensions, truncating them is equivalent to requesting fewer dimensions
+    truncated_dims = dims // 2
+    while truncated_dims >= 256:
+        truncated = normalize(base[:, :truncated_dims])
+        found = top_k(truncated, normalize(queries[:, :truncated_dims]), k)
+        recall = recall_at_k(found, truth)
+        rows.append((f"truncated to {truncated_dims}", 4 * truncated_dims, recall))
+        truncated_dims //= 2
+
+    print(f"{n} vectors of {dims} dimensions, {n_queries} queries, recall@{k}")
+    print(f"{'scheme':<28}{'bytes/vector':>14}{'index MB':>10}{'recall':>8}")
+    for name, vector_bytes, recall in rows:
+        index_mb = vector_bytes * n / 1e6
+        print(f"{name:<28}{vector_bytes:>14g}{index_mb:>10.2f}{recall:>8.3f}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark memory and recall of vector compression schemes."
+    )
+    parser.add_argument(
+        "--vectors",
+        type=str,
+        default=str(CACHE_PATH / "vectors_KID.npy"),
+        help="Path to a .npy dump of embedding vectors",
+    )
+    parser.add_argument(
+        "--file", type=str, help="Json chunks file to embed if the dump does not exist"
+    )
+    parser.add_argument("--k", type=int, default=CONFIG["top_k"])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument(
+        "--oversampling", type=float, default=CONFIG["vector_oversampling"]
+    )
+
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.vectors, args.file)
+    benchmark(vectors, args.k, args.queries, args.oversampling)
@@ -0,0 +1,151 @@
+import os
+import time
+import argparse
+
+import numpy as np
+from azure.search.documents.models import VectorizedQuery
+
+from .benchmark_compression import load_vectors, normalize, recall_at_k, top_k
+from ..utils import CACHE_PATH, CONFIG, get_logger
+
+logger = get_logger(__name__)
+
+
+def parse_parameters(value):
+    """
+    Parse a "m:ef_construction:ef_search" HNSW parameter set.
+    """
+    m, ef_construction, ef_search = (int(v) for v in value.split(":"))
+    return {"m": m, "ef_construction": ef_construction, "ef_search": ef_search}
+
+
+def wait_for_indexing(vector_db, count, timeout=600):
+    """
+    Wait until the uploaded documents are searchable.
+    """
+    start = time.monotonic()
+    while vector_db.search_client.get_document_count() < count:
+        if time.monotonic() - start > timeout:
+            raise TimeoutError(f"Index '{vector_db.search_index}' is still indexing")
+        time.sleep(2)
+
+
+def benchmark_parameters(vector_db, base, queries, truth, k):
+    """
+    Index the base vectors with the HNSW parameters of the vector database, then
+    query them, returning the recall@k and the latencies in milliseconds.
+    """
+    vector_db.reset_index()
+    vector_db.upload_documents(
+        [
+            {"id": str(i), "file": "benchmark", "contentVector": vector.tolist()}
+            for i, vector in enumerate(base)
+        ]
+    )
+    wait_for_indexing(vector_db, len(base))
+
+    found, latencies = [], []
+    for query in queries:
+        vector_query = VectorizedQuery(
+            vector=query.tolist(), k_nearest_neighbors=k, fields="contentVector"
+        )
+        start = time.perf_counter()
+        results = vector_db.search_client.search(
+            search_text=None, vector_queries=[vector_query], select=["id"], top=k
+        )
+        ids = [int(result["id"]) for result in results]
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(ids + [-1] * (k - len(ids)))
+
+    return recall_at_k(np.array(found), truth), np.array(latencies)
+
+
+def benchmark(vectors, parameter_sets, k, n_queries, index_prefix, seed=0):
+    """
+    Compare HNSW parameter sets by recall@k against exact search and query latency.
+    Each parameter set is indexed in its own temporary Azure AI Search index.
+    Held-out vectors are used as queries.
+    """
+    from ..database import VectorDatabase
+
+    rng = np.random.default_rng(seed)
+    vectors = normalize(vectors.astype(np.float32))
+    order = rng.permutation(len(vectors))
+    queries, base = vectors[order[:n_queries]], vectors[order[n_queries:]]
+    truth = top_k(base, queries, k)
+
+    rows = []
+    for i, parameters in enumerate(parameter_sets):
+        config = CONFIG.copy()
+        config["hnsw_parameters"] = parameters
+        config["vector_search_profile"] = "myHnswProfile"
+        vector_db = VectorDatabase(
+            config=config,
+            search_index=f"{index_prefix}-{i}",
+            conn_str=os.environ["AIPROJECT_CONNECTION_STRING"],
+            model=os.environ["DEPLOYMENT_NAME"],
+            emb_model=os.environ["EMBEDDINGS_MODEL"],
+        )
+        try:
+            recall, latencies = benchmark_parameters(
+                vector_db, base, queries, truth, k
+            )
+        finally:
+            vector_db.index_client.delete_index(vector_db.search_index)
+            vector_db.manifest.clear()
+            vector_db.close()
+        rows.append((parameters, recall, latencies))
+        logger.info(f"⏱️ {parameters}: recall@{k} {recall:.3f}")
+
+    print(f"{len(base)} vectors, {n_queries} queries, recall@{k}")
+    print(
+        f"{'m':>4}{'ef_construction':>17}{'ef_search':>11}"
+        f"{'recall':>8}{'p50 ms':>9}{'p95 ms':>9}"
+    )
+    for parameters, recall, latencies in rows:
+        print(
+            f"{parameters['m']:>4}{parameters['ef_construction']:>17}"
+            f"{parameters['ef_search']:>11}{recall:>8.3f}"
+            f"{np.percentile(latencies, 50):>9.1f}{np.percentile(latencies, 95):>9.1f}"
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark recall and latency of HNSW parameter sets."
+    )
+    parser.add_argument(
+        "--vectors",
+        type=str,
+        default=str(CACHE_PATH / "vectors_KID.npy"),
+        help="Path to a .npy dump of embedding vectors",
+    )
+    parser.add_argument(
+        "--file", type=str, help="Json chunks file to embed if the dump does not exist"
+    )
+    parser.add_argument(
+        "--params",
+        type=parse_parameters,
+        nargs="+",
+        default=[
+            CONFIG["hnsw_parameters"],
+            {"m": 4, "ef_construction": 400, "ef_search": 100},
+            {"m": 8, "ef_construction": 400, "ef_search": 200},
+            {"m": 16, "ef_construction": 400, "ef_search": 500},
+        ],
+        help="HNSW parameter sets to compare, as m:ef_construction:ef_search",
+    )
+    parser.add_argument("--k", type=int, default=CONFIG["top_k"])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument(
+        "--index-prefix",
+        type=str,
+        default="hnsw-benchmark",
+        help="Name prefix of the temporary search indexes",
+    )
+
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.vectors, args.file)
+    benchmark(vectors, args.params, args.k, args.queries, args.index_prefix)
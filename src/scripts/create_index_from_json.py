@@ -1,72 +1,201 @@
 import sys
 import os
 import json
-import uuid
+import queue
+import threading
 import argparse
+from itertools import islice
+from typing import Iterator
 
 # sys.path.append("./src/")
 
-from ..database import VectorDatabase
+from ..database import LocalVectorDatabase, VectorDatabase
+from ..database.vector_db import document_id
 from ..utils import CONFIG, get_logger
+from ..utils.cache import content_hash
 
+logger = get_logger(__name__)
 
-def create_docs_from_json(json_file, vector_db):
-    with open(json_file, "r") as f:
-        datas = json.load(f)
 
-    items = []
+def iter_json_array(json_file, read_size=1 << 16) -> Iterator[dict]:
+    """
+    Incrementally parse a file holding a JSON array, yielding one element at a time
+    without loading the whole file in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(json_file, "r") as f:
+        buffer, pos, started = "", 0, False
+        eof = False
+        while True:
+            # skip whitespace and separators between elements
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if not started and pos < len(buffer):
+                if buffer[pos] != "[":
+                    raise ValueError(f"{json_file} does not contain a JSON array")
+                started, pos = True, pos + 1
+                continue
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # the element is incomplete, read more data
+                if eof:
+                    raise
+                data = f.read(read_size)
+                eof = not data
+                buffer, pos = buffer[pos:] + data, 0
+                continue
+
+            if end == len(buffer) and not eof:
+                # a number may continue in the next read, e.g. "12" of "12345"
+                data = f.read(read_size)
+                eof = not data
+                buffer, pos = buffer[pos:] + data, 0
+                continue
+
+            yield element
+            pos = end
+            if pos > read_size:
+                buffer, pos = buffer[pos:], 0
+
+
+def create_docs_from_json(datas, vector_db):
+    items = {}
     for data in datas:
-        id = str(uuid.uuid4())
-        emb = vector_db.embeddings.embed(input=data["Chunk"], model=vector_db.emb_model)
+        metadata = {
+            key: value
+            for key, value in data.items()
+            if key not in ["Chunk", "from", "type"]
+        }
+        id = document_id(data["from"], data["Chunk"], metadata)
         rec = {
             "id": id,
             "content": data["Chunk"],
             "title": data["from"],
             "file": data["from"],
-            "contentVector": emb.data[0].embedding,
         }
-        for key, value in data.items():
-            if key not in ["Chunk", "from", "type"]:
-                rec[key] = value
-        items.append(rec)
-
-    return items
+        rec.update(metadata)
+        # identical records share the same id
+        items.setdefault(id, rec)
 
+    items = list(items.values())
+    embeddings = vector_db.embed_documents([rec["content"] for rec in items])
+    for rec, embedding in zip(items, embeddings):
+        rec["contentVector"] = embedding
 
-def create_index_from_json(json_file, vector_db):
-    # If a search index already exists, delete it:
-    index_names = vector_db.list_index_names()
-    if vector_db.search_index in index_names:
-        vector_db.index_client.delete_index(vector_db.search_index)
-        logger.info(
-            f"🗑️  Found existing index named '{vector_db.search_index}', and deleted it"
-        )
-
-    # create an empty search index
-    index_definition = vector_db.create_index_definition()
-    vector_db.index_client.create_index(index_definition)
+    return items
 
-    docs = create_docs_from_json(json_file, vector_db)
 
-    vector_db.search_client.upload_documents(docs)
+def checkpoint_path(json_file) -> str:
+    """
+    Path of the checkpoint file of a json file, in the local cache.
+    """
+    name = os.path.basename(json_file)
+    digest = content_hash(os.path.abspath(json_file))[:12]
+    return os.path.join(CONFIG["ingest_checkpoint_path"], f"{name}.{digest}.checkpoint")
+
+
+def read_checkpoint(checkpoint_file, index_name) -> int:
+    """
+    Return the number of records already uploaded to the index, if any.
+    """
+    if not os.path.exists(checkpoint_file):
+        return 0
+    with open(checkpoint_file, "r") as f:
+        checkpoint = json.load(f)
+    if checkpoint["index"] != index_name:
+        return 0
+    return checkpoint["records"]
+
+
+def write_checkpoint(checkpoint_file, index_name, records):
+    os.makedirs(os.path.dirname(os.path.abspath(checkpoint_file)), exist_ok=True)
+    with open(checkpoint_file + ".tmp", "w") as f:
+        json.dump({"index": index_name, "records": records}, f)
+    os.replace(checkpoint_file + ".tmp", checkpoint_file)
+
+
+def create_index_from_json(json_file, vector_db, restart=False):
+    """
+    Embed and upload the records of a json file, in batches.
+    Records are read, embedded and uploaded as a pipeline with bounded queues. The
+    number of uploaded records is saved to a checkpoint file after each batch, so an
+    interrupted run resumes where it stopped.
+    """
+    checkpoint_file = checkpoint_path(json_file)
+    done = 0 if restart else read_checkpoint(checkpoint_file, vector_db.search_index)
+
+    if done:
+        logger.info(f"⏩ Resuming '{json_file}' after {done} uploaded records")
+    else:
+        # replace the search index with an empty one
+        vector_db.reset_index()
+        write_checkpoint(checkpoint_file, vector_db.search_index, 0)
+
+    batch_size = CONFIG["ingest_batch_size"]
+    records = islice(iter_json_array(json_file), done, None)
+    uploads = queue.Queue(maxsize=CONFIG["ingest_queue_size"])
+    errors = []
+
+    def upload_worker():
+        uploaded = done
+        while (item := uploads.get()) is not None:
+            if errors:
+                continue
+            try:
+                # the checkpoint counts records, identical ones make a single document
+                records_count, docs = item
+                if vector_db.upload_documents(docs) != len(docs):
+                    raise RuntimeError("Some documents could not be uploaded")
+                uploaded += records_count
+                write_checkpoint(checkpoint_file, vector_db.search_index, uploaded)
+            except Exception as e:
+                errors.append(e)
+
+    worker = threading.Thread(target=upload_worker)
+    worker.start()
+    try:
+        while not errors and (batch := list(islice(records, batch_size))):
+            uploads.put((len(batch), create_docs_from_json(batch, vector_db)))
+    finally:
+        uploads.put(None)
+        worker.join()
+        vector_db.invalidate_cache()
+
+    if errors:
+        raise errors[0]
+
+    uploaded = read_checkpoint(checkpoint_file, vector_db.search_index)
+    os.remove(checkpoint_file)
     logger.info(
-        f"➕ Uploaded {len(docs)} documents to '{vector_db.search_index}' index"
+        f"➕ Uploaded {uploaded} records to '{vector_db.search_index}' index"
     )
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Create an index from a json file.")
     parser.add_argument("--file", type=str, required=True, help="Path to the json file")
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore the checkpoint of a previous run and rebuild the index",
+    )
 
     args = parser.parse_args()
-    logger = get_logger(__name__)
 
     emb_model = os.environ["EMBEDDINGS_MODEL"]
     index_name = os.environ["AISEARCH_INDEX_NAME"]
     conn_str = os.environ["AIPROJECT_CONNECTION_STRING"]
     model_name = os.environ["DEPLOYMENT_NAME"]
 
-    vector_db = VectorDatabase(
+    if CONFIG["vector_backend"] == "local":
+        vector_db_class = LocalVectorDatabase
+    else:
+        vector_db_class = VectorDatabase
+    vector_db = vector_db_class(
         config=CONFIG,
         search_index=index_name,
         conn_str=conn_str,
@@ -77,4 +206,4 @@ if __name__ == "__main__":
     if not args.file.lower().endswith(".json"):
         print("Error: The file must be a JSON file.")
     else:
-        create_index_from_json(args.file, vector_db)
+        create_index_from_json(args.file, vector_db, restart=args.restart)
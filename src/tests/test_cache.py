@@ -0,0 +1,44 @@
+from ..utils.cache import DiskCache, EmbeddingCache, TTLCache
+
+
+def test_embedding_cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_entries=10)
+    cache.set_embeddings("model", ["a", "b"], [[0.5, 1.0], [2.0, -1.0]])
+
+    assert cache.get_embeddings("model", ["b", "c", "a"]) == [
+        [2.0, -1.0],
+        None,
+        [0.5, 1.0],
+    ]
+    # the same text embedded with another model is a different entry
+    assert cache.get_embeddings("other-model", ["a"]) == [None]
+    cache.close()
+
+
+def test_disk_cache_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    # touch "a" so that "b" becomes the least recently used entry
+    assert cache.get("a") == b"1"
+    cache.set("c", b"3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.get("c") == b"3"
+    cache.close()
+
+
+def test_ttl_cache():
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    # "b" was the least recently used entry
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+    expired = TTLCache(max_entries=2, ttl=0)
+    expired.set("a", 1)
+    assert expired.get("a") is None
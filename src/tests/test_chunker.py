@@ -0,0 +1,43 @@
+from ..rag import tokenizer
+from ..rag.chunker import TextChunker
+from ..rag.tokenizer import WhitespaceTokenizer, get_tokenizer
+
+
+def make_chunker(max_chunk_size, chunk_overlap=0):
+    # recursive_chunking needs neither the AI project nor the OCR cache
+    chunker = TextChunker.__new__(TextChunker)
+    chunker.config = {
+        "separator": "|",
+        "max_chunk_size": max_chunk_size,
+        "chunk_overlap": chunk_overlap,
+    }
+    chunker.tokenizer = WhitespaceTokenizer()
+    return chunker
+
+
+def test_recursive_chunking():
+    chunker = make_chunker(max_chunk_size=5)
+    texts = ["one two|three four| |five", "six seven eight|nine"]
+
+    # blank blocks are skipped, blocks are merged across texts
+    assert chunker.recursive_chunking(texts) == [
+        "one two\nthree four\nfive",
+        "six seven eight\nnine",
+    ]
+
+
+def test_recursive_chunking_overlap():
+    chunker = make_chunker(max_chunk_size=5, chunk_overlap=2)
+    texts = ["a b|c d|e f|g h i j"]
+
+    # trailing blocks fitting in the overlap are repeated in the next chunk, as
+    # long as the next block still fits
+    assert chunker.recursive_chunking(texts) == ["a b\nc d", "c d\ne f", "g h i j"]
+
+
+def test_tokenizer_fallback(monkeypatch):
+    def offline(encoding):
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(tokenizer, "TiktokenTokenizer", offline)
+    assert isinstance(get_tokenizer("cl100k_base"), WhitespaceTokenizer)
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from ..scripts import create_index_from_json as ingestion
+from ..scripts.create_index_from_json import create_index_from_json, iter_json_array
+
+
+class FakeVectorDatabase:
+    """Records uploaded documents, failing on the `fail_at`-th upload."""
+
+    search_index = "test-index"
+
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.uploads = 0
+        self.documents = []
+        self.resets = 0
+
+    def reset_index(self):
+        self.resets += 1
+        self.documents = []
+
+    def embed_documents(self, texts):
+        return [[float(len(text))] for text in texts]
+
+    def upload_documents(self, documents):
+        self.uploads += 1
+        if self.uploads == self.fail_at:
+            raise RuntimeError("Service unavailable")
+        self.documents.extend(documents)
+        # like the uploader, count the distinct keys indexed
+        return len({doc["id"] for doc in documents})
+
+    def invalidate_cache(self):
+        pass
+
+
+def make_records(n):
+    return [
+        {"Chunk": f"chunk {i}", "from": "KID.pdf", "risk_class": i} for i in range(n)
+    ]
+
+
+def test_iter_json_array(tmp_path):
+    records = make_records(20) + [{"Chunk": "nested [1, {\"a\": \"]\"}]", "from": "x"}]
+    json_file = tmp_path / "chunks.json"
+    json_file.write_text(json.dumps(records, indent=2))
+
+    # reads much smaller than an element split elements across reads
+    assert list(iter_json_array(json_file, read_size=7)) == records
+    json_file.write_text("[]")
+    assert list(iter_json_array(json_file)) == []
+    # numbers split across reads
+    json_file.write_text("[12345, 678]")
+    assert list(iter_json_array(json_file, read_size=3)) == [12345, 678]
+
+
+def test_create_index_from_json_resumes(tmp_path, monkeypatch):
+    monkeypatch.setitem(ingestion.CONFIG, "ingest_batch_size", 3)
+    monkeypatch.setitem(ingestion.CONFIG, "ingest_checkpoint_path", str(tmp_path))
+    json_file = tmp_path / "chunks.json"
+    json_file.write_text(json.dumps(make_records(10)))
+
+    # the third batch fails, the first two are checkpointed
+    vector_db = FakeVectorDatabase(fail_at=3)
+    with pytest.raises(RuntimeError):
+        create_index_from_json(str(json_file), vector_db)
+    assert len(vector_db.documents) == 6
+
+    vector_db.fail_at = None
+    create_index_from_json(str(json_file), vector_db)
+    assert vector_db.resets == 1
+    assert [doc["content"] for doc in vector_db.documents] == [
+        f"chunk {i}" for i in range(10)
+    ]
+    assert list(tmp_path.glob("*.checkpoint")) == []
+
+
+def test_create_index_from_json_identical_records(tmp_path, monkeypatch):
+    monkeypatch.setitem(ingestion.CONFIG, "ingest_batch_size", 4)
+    monkeypatch.setitem(ingestion.CONFIG, "ingest_checkpoint_path", str(tmp_path))
+    json_file = tmp_path / "chunks.json"
+    records = make_records(3)
+    json_file.write_text(json.dumps(records[:2] + records[:1] + records[2:]))
+
+    vector_db = FakeVectorDatabase()
+    create_index_from_json(str(json_file), vector_db)
+    assert [doc["content"] for doc in vector_db.documents] == [
+        "chunk 0",
+        "chunk 1",
+        "chunk 2",
+    ]
@@ -0,0 +1,76 @@
+from ..database.local_vector_db import LocalIndex
+from ..rag.diversify import mmr
+
+
+def make_documents():
+    return [
+        {
+            "id": "1",
+            "content": "Government bonds with a low risk class",
+            "file": "KID_1.pdf",
+            "contentVector": [1.0, 0.0, 0.0],
+        },
+        {
+            "id": "2",
+            "content": "Emerging markets equity with a high risk class",
+            "file": "KID_1.pdf",
+            "contentVector": [0.0, 1.0, 0.0],
+        },
+        {
+            "id": "3",
+            "content": "Corporate bonds denominated in euro",
+            "file": "KID_2.pdf",
+            "contentVector": [0.7, 0.0, 0.7],
+        },
+    ]
+
+
+def test_local_index_search(tmp_path):
+    index = LocalIndex(str(tmp_path / "index"), searchable_fields=["content"])
+    assert index.upsert(make_documents()) == 3
+
+    results = index.search("government bonds", [1.0, 0.1, 0.0], top=2)
+    assert [doc["id"] for doc in results] == ["1", "3"]
+    assert results[0]["@search.score"] > results[1]["@search.score"]
+
+    # the index is persisted on disk
+    reloaded = LocalIndex(str(tmp_path / "index"), searchable_fields=["content"])
+    assert sorted(reloaded.file_ids("KID_1.pdf")) == ["1", "2"]
+
+
+def test_local_index_upsert_and_delete(tmp_path):
+    index = LocalIndex(str(tmp_path / "index"), searchable_fields=["content"])
+    documents = make_documents()
+    index.upsert(documents)
+
+    documents[0]["content"] = "Updated content"
+    index.upsert(documents[:1])
+    assert len(index.documents) == 3
+    assert index.documents[index.rows["1"]]["content"] == "Updated content"
+
+    assert index.delete(index.file_ids("KID_1.pdf")) == 2
+    assert [doc["id"] for doc in index.documents] == ["3"]
+    assert index.search("bonds", [1.0, 0.0, 0.0], top=5)[0]["id"] == "3"
+
+
+def test_local_index_filters(tmp_path):
+    index = LocalIndex(str(tmp_path / "index"), searchable_fields=["content"])
+    documents = make_documents()
+    for doc, risk_class in zip(documents, [1, 5, 2]):
+        doc["risk_class"] = str(risk_class)
+    index.upsert(documents)
+
+    results = index.search("bonds", [1.0, 0.0, 0.0], top=5, filters={"risk_class": 5})
+    assert [doc["id"] for doc in results] == ["2"]
+    assert index.search("bonds", [1.0, 0.0, 0.0], 5, {"risk_class": "7"}) == []
+
+
+def test_mmr_drops_near_duplicates():
+    query = [1.0, 0.0, 0.0]
+    vectors = [
+        [1.0, 0.1, 0.0],
+        [1.0, 0.1, 0.001],  # near-duplicate of the first document
+        [0.8, 0.0, 0.6],
+    ]
+    assert mmr(query, vectors, top=2, lambda_mult=0.7, dedup_threshold=0.99) == [0, 2]
+    assert mmr(query, vectors, top=3, lambda_mult=1.0) == [0, 1, 2]
@@ -0,0 +1,38 @@
+from ..rag.packing import pack_context, truncate_sentences
+from ..rag.tokenizer import WhitespaceTokenizer
+
+tokenizer = WhitespaceTokenizer()
+
+
+def test_truncate_sentences():
+    text = "One two three. Four five. Six seven eight nine."
+    assert truncate_sentences(text, tokenizer, 20) == (text, 9)
+    assert truncate_sentences(text, tokenizer, 6) == ("One two three. Four five.", 6)
+    assert truncate_sentences(text, tokenizer, 2) == ("", 0)
+
+
+def test_pack_context():
+    documents = [
+        {"content": "Low score chunk.", "@search.score": 0.1},
+        {
+            "content": "High score chunk. It has a second sentence.",
+            "product_name": "ETF A",
+            "risk_class": 3,
+            "@search.score": 0.9,
+        },
+    ]
+    context, tokens = pack_context(
+        documents, ["product_name", "manufacturer", "risk_class"], tokenizer, 100
+    )
+    assert context == (
+        "[ETF A | 3]\nHigh score chunk. It has a second sentence.\n\nLow score chunk."
+    )
+    assert tokens <= 100
+
+    context, tokens = pack_context(documents, ["product_name"], tokenizer, 8)
+    assert context == "[ETF A]\nHigh score chunk."
+    assert tokens <= 8
+
+    # no entity fields configured
+    context, _ = pack_context(documents, None, tokenizer, 100)
+    assert context.startswith("High score chunk.")
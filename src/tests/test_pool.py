@@ -0,0 +1,77 @@
+import pyodbc
+import pytest
+
+from ..database.pool import ConnectionPool
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query):
+        if self.conn.broken:
+            raise pyodbc.Error("Communication link failure")
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.broken = False
+        self.closed = False
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+def test_connection_pool_reuse_and_limit():
+    pool = ConnectionPool(
+        FakeConnection, max_size=2, timeout=0.01, health_check_interval=60
+    )
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    # open transactions are not handed over to the next user
+    assert first.rollbacks == 2
+
+    a, b = pool.acquire(), pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    assert pool.stats()["utilization"] == 1.0
+    pool.release(a)
+    pool.release(b, broken=True)
+    assert b.closed
+
+    stats = pool.stats()
+    assert stats["size"] == 1 and stats["in_use"] == 0 and stats["checkouts"] == 4
+
+
+def test_connection_pool_health_check():
+    pool = ConnectionPool(
+        FakeConnection, max_size=1, timeout=1, health_check_interval=0
+    )
+
+    with pool.connection() as conn:
+        pass
+    conn.broken = True
+
+    with pool.connection() as replacement:
+        assert replacement is not conn
+    assert conn.closed
+    assert pool.stats()["replaced"] == 1
+
+    pool.close()
+    assert replacement.closed
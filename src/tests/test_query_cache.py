@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import pyodbc
+
+from ..database.query_cache import QueryCache, is_write, normalize_sql
+from ..database.service import SQLDatabase
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+        self.rowcount = 1
+
+    def execute(self, query):
+        if "CHANGE_TRACKING_CURRENT_VERSION" in query:
+            if FakeConnection.last_update is None:
+                raise pyodbc.Error("VIEW DATABASE STATE permission denied")
+            self.rows = [(None, FakeConnection.last_update)]
+            return
+        FakeConnection.executed.append(query)
+        if not is_write(normalize_sql(query)):
+            self.description = [("count",)]
+            self.rows = [(len(FakeConnection.executed),)]
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    last_update = None
+    executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def make_database():
+    db = SQLDatabase("server", "database", "user", "password")
+    db.pool.connect = FakeConnection
+    FakeConnection.executed = []
+    FakeConnection.last_update = datetime(2026, 1, 1)
+    return db
+
+
+def test_normalize_sql():
+    query = "SELECT  SUM(amount)\n FROM dbo.[qna] WHERE merchant_city = 'Beulah  X';"
+    key = normalize_sql(query)
+    assert key == "select sum(amount) from dbo.[qna] where merchant_city = 'Beulah  X'"
+    assert not is_write(key)
+    assert is_write(normalize_sql("DELETE FROM qna WHERE id = 1"))
+    assert is_write(normalize_sql("SELECT * INTO #tmp FROM qna"))
+    assert not is_write(normalize_sql("SELECT * FROM qna WHERE note = 'update'"))
+
+
+def test_query_cache_versions():
+    cache = QueryCache(max_entries=10, ttl=60)
+    key = "select count(*) from qna"
+
+    assert cache.get(key, "1") is None
+    cache.set(key, "1", "result")
+    assert cache.get(key, "1") == "result"
+    assert cache.get(key, "2") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_query_cache_data_changes():
+    db = make_database()
+    read = "SELECT COUNT(*) FROM Operators o, Production p WHERE o.id = p.operator_id"
+
+    first = db.query(read)
+    assert db.query(read) is first
+    # the data changed, e.g. seeded or loaded outside of this class
+    FakeConnection.last_update = datetime(2026, 1, 2)
+    second = db.query(read)
+    assert second is not first
+    assert db.query(read) is second
+
+    # write statements are not cached
+    db.query("SELECT * INTO #tmp FROM Production")
+    db.query("SELECT * INTO #tmp FROM Production")
+    assert len(FakeConnection.executed) == 4
+
+
+def test_query_cache_without_data_version():
+    db = make_database()
+    FakeConnection.last_update = None
+    read = "SELECT COUNT(*) FROM Production"
+
+    assert db.query(read) is not db.query(read)
+    assert len(FakeConnection.executed) == 2
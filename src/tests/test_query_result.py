@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+from ..database.result import QueryResult
+
+
+class FakeCursor:
+    def __init__(self, columns, rows):
+        self.description = [(name, None) for name in columns]
+        self.rows = rows
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def fetchone(self):
+        return self.fetchmany(1)[0] if self.rows else None
+
+
+def make_result(rows, **limits):
+    limits = {"max_rows": 3, "max_bytes": 1000, "max_scan_rows": 100, **limits}
+    cursor = FakeCursor(["name", "amount"], rows)
+    return QueryResult.from_cursor(cursor, fetch_size=4, **limits)
+
+
+def test_query_result_complete():
+    result = make_result([("a", 1), ("b", None)])
+    assert not result.truncated
+    assert str(result) == "name | amount\na | 1\nb | NULL"
+
+
+def test_query_result_truncated():
+    rows = [(f"row {i}", Decimal(i) / 2) for i in range(10)]
+    result = make_result(rows)
+    assert result.rows == rows[:3]
+    assert result.row_count == 10 and result.complete
+    assert str(result).splitlines()[-2:] == [
+        "... showing 3 of 10 rows",
+        "amount: min 0, max 4.5",
+    ]
+
+    # the byte limit applies before the row limit, the scan limit stops counting
+    result = make_result(rows, max_bytes=40, max_scan_rows=6)
+    assert len(result.rows) == 2
+    assert result.row_count == 6 and not result.complete
+    assert "... showing 2 of over 6 rows" in str(result)
@@ -0,0 +1,120 @@
+from collections import namedtuple
+from datetime import datetime
+
+from ..database.service import SQLDatabase
+from ..utils import CONFIG
+
+Row = namedtuple(
+    "Row",
+    [
+        "table_name",
+        "column_name",
+        "data_type",
+        "is_primary_key",
+        "fk_name",
+        "referenced_table",
+    ],
+)
+
+CATALOG = [
+    Row("customers", "id", "int", 1, None, None),
+    Row("lines", "order_id", "int", 1, "fk_order", "orders"),
+    Row("lines", "line", "int", 1, None, None),
+    Row("lines", "customer_id", "int", 0, "fk_customer", "customers"),
+    # a column in two foreign keys appears once per key
+    Row("lines", "customer_id", "int", 0, "fk_billed", "customers"),
+    Row("orders", "id", "int", 1, None, None),
+]
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query):
+        self.conn.executed.append(query)
+
+    def fetchone(self):
+        return (len(CATALOG), FakeConnection.modify_date)
+
+    def fetchall(self):
+        return list(CATALOG)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    modify_date = datetime(2026, 1, 1)
+    executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def make_database(schema_cache):
+    config = dict(CONFIG, schema_cache=schema_cache)
+    db = SQLDatabase("server", "database", "user", "password", config=config)
+    db.pool.connect = FakeConnection
+    return db
+
+
+def catalog_queries():
+    return sum("sys.tables" in query for query in FakeConnection.executed)
+
+
+def test_discover_assembles_rows():
+    FakeConnection.executed = []
+    schema = make_database(None).discover()
+
+    customers, lines, orders = schema.tables
+    assert [t.name for t in schema.tables] == ["customers", "lines", "orders"]
+    assert [(c.name, c.is_primary_key) for c in lines.columns] == [
+        ("order_id", True),
+        ("line", True),
+        ("customer_id", False),
+    ]
+    assert [(fk.name, fk.referenced_table) for fk in lines.foreign_keys] == [
+        ("fk_order", "orders"),
+        ("fk_customer", "customers"),
+        ("fk_billed", "customers"),
+    ]
+    assert customers.foreign_keys == [] and orders.columns[0].is_primary_key
+
+
+def test_discover_schema_cache(tmp_path):
+    path = str(tmp_path / "schema.json")
+    FakeConnection.executed = []
+    FakeConnection.modify_date = datetime(2026, 1, 1)
+    schema = make_database(path).discover()
+    assert catalog_queries() == 1
+
+    # same version: served from memory, then from disk by another worker
+    db = make_database(path)
+    assert db.discover() == schema
+    assert db.discover() == schema
+    assert catalog_queries() == 1
+
+    # the schema changed: discovered again
+    FakeConnection.modify_date = datetime(2026, 1, 2)
+    assert db.discover() == schema
+    assert catalog_queries() == 2
+
+
+def test_discover_ignores_corrupt_schema_cache(tmp_path):
+    path = tmp_path / "schema.json"
+    path.write_text('{"server/database": {"version": ')
+    FakeConnection.executed = []
+    schema = make_database(str(path)).discover()
+    assert catalog_queries() == 1
+
+    # the cache was rewritten
+    assert make_database(str(path)).discover() == schema
+    assert catalog_queries() == 1
+    assert [p.name for p in tmp_path.iterdir()] == ["schema.json"]
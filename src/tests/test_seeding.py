@@ -0,0 +1,16 @@
+import numpy as np
+from faker import Faker
+
+from ..database.utils import generate_records, make_value_pools
+
+
+def test_generate_records():
+    pools = make_value_pools(Faker(), size=10)
+    records = generate_records(100, 50, pools, np.random.default_rng(0))
+
+    assert len(records) == 50
+    assert [record[0] for record in records] == list(range(101, 151))
+    assert all(len(record) == 12 for record in records)
+    assert all(record[1] in pools["well_name"] for record in records)
+    # DECIMAL(5, 2) columns
+    assert all(abs(record[9]) < 1000 and abs(record[10]) < 1000 for record in records)
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+from ..database import uploader
+from ..database.uploader import DocumentUploader
+
+CONFIG = {
+    "upload_batch_size": 2,
+    "upload_max_bytes": 1_000_000,
+    "upload_max_workers": 2,
+    "upload_max_retries": 3,
+}
+
+
+class FakeSearchClient:
+    """Rejects each of the `flaky` keys the first `failures` times it is sent."""
+
+    def __init__(self, flaky, failures=1):
+        self.flaky = dict.fromkeys(flaky, failures)
+        self.sent = []
+
+    def upload_documents(self, batch):
+        self.sent.append([doc["id"] for doc in batch])
+        results = []
+        for doc in batch:
+            rejected = self.flaky.get(doc["id"], 0) > 0
+            if rejected:
+                self.flaky[doc["id"]] -= 1
+            results.append(SimpleNamespace(key=doc["id"], succeeded=not rejected))
+        return results
+
+
+def test_uploader_retries_failed_documents(monkeypatch):
+    monkeypatch.setattr(uploader.time, "sleep", lambda seconds: None)
+    client = FakeSearchClient(flaky=["2"])
+    documents = [{"id": str(i), "content": "text"} for i in range(4)]
+
+    uploaded = DocumentUploader(client, CONFIG).upload(documents)
+
+    assert sorted(uploaded) == ["0", "1", "2", "3"]
+    # only the rejected document is sent again
+    assert sorted(client.sent) == [["0", "1"], ["2"], ["2", "3"]]
+
+
+def test_uploader_gives_up_after_retries(monkeypatch):
+    monkeypatch.setattr(uploader.time, "sleep", lambda seconds: None)
+    client = FakeSearchClient(flaky=["1"], failures=10)
+    documents = [{"id": str(i), "content": "text"} for i in range(2)]
+
+    assert DocumentUploader(client, CONFIG).upload(documents) == ["0"]
+    assert len(client.sent) == CONFIG["upload_max_retries"] + 1
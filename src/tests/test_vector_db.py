@@ -0,0 +1,235 @@
+import asyncio
+import re
+import threading
+from contextvars import ContextVar
+
+from azure.core.exceptions import HttpResponseError
+
+from ..database.manifest import DocumentManifest
+from ..database.vector_db import VectorDatabase, document_id
+from ..utils import CONFIG
+from ..utils.cache import TTLCache
+
+
+class FakeProject:
+    def close(self):
+        pass
+
+
+class FakeVectorDatabase(VectorDatabase):
+    """
+    VectorDatabase without remote clients, each query vector and search result is
+    derived from the query text.
+    """
+
+    def __init__(self, config: dict = CONFIG):
+        self.config = config
+        self.search_index = "index"
+        self.emb_model = "text-embedding-3-small"
+        self.embedding_key = self.emb_model
+        self.embedding_cache = None
+        self.query_cache = TTLCache(config["query_cache_size"], 60)
+        self.result_cache = TTLCache(config["query_cache_size"], 60)
+        self.project = FakeProject()
+        self.manifest = None
+        self.async_project = None
+        self._speculation = ContextVar("speculation", default=None)
+        self.searched = []
+
+    async def aembed_queries(self, search_queries: list[str]) -> list[list[float]]:
+        return [[1.0, 0.0, 0.0] for _ in search_queries]
+
+    async def asearch(self, search_text, search_vector, top, filters=None):
+        self.searched.append(search_text)
+        await asyncio.sleep(0)
+        return [{"id": search_text, "content": search_text}]
+
+
+SPECULATED = "What are the costs of the Vanguard FTSE All-World ETF?"
+QUERY = "costs of the Vanguard FTSE All-World ETF"
+
+
+def test_speculation_served_in_its_own_context():
+    vector_db = FakeVectorDatabase()
+
+    async def chat_turn():
+        vector_db.speculate(SPECULATED)
+        return await vector_db.aget_documents(QUERY)
+
+    documents = asyncio.run(chat_turn())
+    assert [doc["id"] for doc in documents] == [SPECULATED]
+    assert vector_db.searched == [SPECULATED]
+
+    # another chat sending the same query does not get the speculative documents
+    documents = asyncio.run(vector_db.aget_documents(QUERY))
+    assert [doc["id"] for doc in documents] == [QUERY]
+    assert vector_db.searched == [SPECULATED, QUERY]
+
+
+def test_speculation_not_visible_from_another_context():
+    vector_db = FakeVectorDatabase()
+    speculated = asyncio.Event()
+
+    async def speculating_chat():
+        vector_db.speculate(SPECULATED)
+        speculated.set()
+        await asyncio.sleep(0)
+
+    async def other_chat():
+        await speculated.wait()
+        return await vector_db.aget_documents(QUERY)
+
+    async def main():
+        return (await asyncio.gather(speculating_chat(), other_chat()))[1]
+
+    documents = asyncio.run(main())
+    assert [doc["id"] for doc in documents] == [QUERY]
+    assert QUERY in vector_db.searched
+
+
+def test_cancel_speculation():
+    vector_db = FakeVectorDatabase()
+
+    async def chat_turn():
+        speculation = vector_db.speculate(SPECULATED)
+        vector_db.cancel_speculation(speculation)
+        assert vector_db._speculation.get() is None
+        documents = await vector_db.aget_documents(QUERY)
+        await asyncio.sleep(0)
+        return speculation, documents
+
+    speculation, documents = asyncio.run(chat_turn())
+    assert speculation[2].cancelled()
+    assert [doc["id"] for doc in documents] == [QUERY]
+    assert vector_db.searched == [QUERY]
+
+
+class ThreadRecordingCache:
+    def __init__(self):
+        self.threads = []
+
+    def get_embeddings(self, model, texts):
+        self.threads.append(threading.get_ident())
+        return [[0.0, 1.0, 0.0] for _ in texts]
+
+
+def test_aembed_queries_reads_the_embedding_cache_off_the_event_loop():
+    vector_db = FakeVectorDatabase()
+    vector_db.embedding_cache = ThreadRecordingCache()
+
+    async def embed():
+        vectors = await VectorDatabase.aembed_queries(vector_db, [QUERY])
+        return vectors, threading.get_ident()
+
+    vectors, loop_thread = asyncio.run(embed())
+    assert vectors == [[0.0, 1.0, 0.0]]
+    [cache_thread] = vector_db.embedding_cache.threads
+    assert cache_thread != loop_thread
+
+
+class FakeSearchClient:
+    """Search client over the ids of a single file."""
+
+    def __init__(self, ids, sortable=True):
+        self.ids = sorted(ids)
+        self.sortable = sortable
+        self.requests = 0
+
+    def search(self, search_text, filter, select, top, order_by=None, skip=0):
+        self.requests += 1
+        if order_by and not self.sortable:
+            raise HttpResponseError(message="Field 'id' is not sortable")
+        ids = self.ids
+        after = re.search(r"id gt '(.*)'", filter)
+        if after:
+            ids = [id for id in ids if id > after.group(1)]
+        return [{"id": id} for id in ids[skip : skip + top]]
+
+
+def test_get_file_ids_pages_in_key_order(tmp_path):
+    vector_db = FakeVectorDatabase(dict(CONFIG, search_page_size=2))
+    vector_db.manifest = DocumentManifest(str(tmp_path / "manifest.sqlite"), "index")
+    vector_db.search_client = FakeSearchClient([f"id{i}" for i in range(5)])
+
+    assert vector_db.get_file_ids("KID.pdf") == [f"id{i}" for i in range(5)]
+    assert vector_db.search_client.requests == 3
+    # recorded in the manifest
+    assert vector_db.get_file_ids("KID.pdf") == [f"id{i}" for i in range(5)]
+    assert vector_db.search_client.requests == 3
+
+
+def test_get_file_ids_without_sortable_ids(tmp_path):
+    vector_db = FakeVectorDatabase(dict(CONFIG, search_page_size=2))
+    vector_db.manifest = DocumentManifest(str(tmp_path / "manifest.sqlite"), "index")
+    vector_db.search_client = FakeSearchClient(
+        [f"id{i}" for i in range(4)], sortable=False
+    )
+
+    assert vector_db.get_file_ids("KID.pdf") == [f"id{i}" for i in range(4)]
+
+
+class FakeChunker:
+    def __init__(self):
+        self.chunks, self.metadata = [], {}
+
+    def chunk_from_pdf(self, path):
+        return list(self.chunks), dict(self.metadata)
+
+
+class FakeUploader:
+    def __init__(self):
+        self.documents = {}
+
+    def upload(self, documents):
+        self.documents.update((doc["id"], doc) for doc in documents)
+        return [doc["id"] for doc in documents]
+
+    def delete(self, keys):
+        keys = [key for key in keys if key in self.documents]
+        for key in keys:
+            del self.documents[key]
+        return keys
+
+
+class IngestingVectorDatabase(FakeVectorDatabase):
+    def __init__(self, manifest_path):
+        super().__init__()
+        self.text_chunker = FakeChunker()
+        self.uploader = FakeUploader()
+        self.manifest = DocumentManifest(manifest_path, "index")
+        # the file is not indexed yet
+        self.search_client = FakeSearchClient([])
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text))] for text in texts]
+
+
+def test_add_to_index_from_pdf_diff(tmp_path):
+    vector_db = IngestingVectorDatabase(str(tmp_path / "manifest.sqlite"))
+    chunker, index = vector_db.text_chunker, vector_db.uploader.documents
+    chunker.chunks, chunker.metadata = ["a", "b", "b"], {"risk_class": "3"}
+
+    vector_db.add_to_index_from_pdf("/data/KID.pdf")
+    # identical chunks make a single document
+    assert vector_db.embedded == ["a", "b"]
+    assert sorted(doc["content"] for doc in index.values()) == ["a", "b"]
+
+    # only the new chunk is embedded and uploaded, the stale one is deleted
+    vector_db.embedded = []
+    chunker.chunks = ["a", "c"]
+    vector_db.add_to_index_from_pdf("/data/KID.pdf")
+    assert vector_db.embedded == ["c"]
+    assert sorted(doc["content"] for doc in index.values()) == ["a", "c"]
+    assert sorted(vector_db.get_file_ids("KID.pdf")) == sorted(index)
+
+    # changed metadata gives new ids to unchanged chunks
+    vector_db.embedded = []
+    chunker.metadata = {"risk_class": "4"}
+    vector_db.add_to_index_from_pdf("/data/KID.pdf")
+    assert vector_db.embedded == ["a", "c"]
+    assert sorted(index) == sorted(
+        document_id("KID.pdf", chunk, {"risk_class": "4"}) for chunk in ["a", "c"]
+    )
+    assert {doc["risk_class"] for doc in index.values()} == {"4"}
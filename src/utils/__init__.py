@@ -1,2 +1,2 @@
-from .config import get_logger, TEMPLATE_PATH, CONFIG, SYSTEM_MESSAGE
+from .config import get_logger, TEMPLATE_PATH, CACHE_PATH, CONFIG, SYSTEM_MESSAGE
 
@@ -0,0 +1,182 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Union
+
+from .config import get_logger
+
+logger = get_logger(__name__)
+
+
+def content_hash(*parts: Union[str, bytes]) -> str:
+    """
+    Hash the given strings (or raw bytes) into a stable hex key.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class TTLCache:
+    """
+    A thread-safe in-process LRU cache whose entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskCache:
+    """
+    A persistent key/value store backed by SQLite.
+    Once more than `max_entries` entries are stored, the least recently used
+    entries are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                accessed REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)"
+        )
+        self.conn.commit()
+
+    def get_many(self, keys: list[str]) -> dict[str, bytes]:
+        """
+        Return the stored values for the keys found in the cache.
+        """
+        found = {}
+        with self._lock:
+            # stay below SQLite's limit on the number of bound parameters
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT key, value FROM cache WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE cache SET accessed = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self.conn.commit()
+        return found
+
+    def set_many(self, items: dict[str, bytes]) -> None:
+        """
+        Store the given values, evicting the least recently used entries if needed.
+        """
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, accessed) VALUES (?, ?, ?)",
+                [(key, value, now) for key, value in items.items()],
+            )
+            (count,) = self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+            if count > self.max_entries:
+                self.conn.execute(
+                    """
+                    DELETE FROM cache WHERE key IN (
+                        SELECT key FROM cache ORDER BY accessed ASC LIMIT ?
+                    )
+                    """,
+                    (count - self.max_entries,),
+                )
+                logger.debug(
+                    f"🧹 Evicted {count - self.max_entries} entries from '{self.path}'"
+                )
+            self.conn.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self.set_many({key: value})
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class EmbeddingCache(DiskCache):
+    """
+    A persistent cache of embedding vectors, keyed by a hash of (model, text).
+    Vectors are stored as float32 blobs.
+    """
+
+    def get_embeddings(
+        self, model: str, texts: list[str]
+    ) -> list[Optional[list[float]]]:
+        """
+        Return the cached embedding of each text, or None when it is not cached.
+        """
+        keys = [content_hash(model, text) for text in texts]
+        found = self.get_many(list(set(keys)))
+        return [
+            array("f", found[key]).tolist() if key in found else None for key in keys
+        ]
+
+    def set_embeddings(
+        self, model: str, texts: list[str], embeddings: list[list[float]]
+    ) -> None:
+        self.set_many(
+            {
+                content_hash(model, text): array("f", embedding).tobytes()
+                for text, embedding in zip(texts, embeddings)
+            }
+        )
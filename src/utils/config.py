@@ -8,13 +8,102 @@ import sys
 # Set "./assets" as the path where assets are stored, resolving the absolute path:
 ASSET_PATH = pathlib.Path(__file__).parent.parent.parent.resolve() / "assets"
 TEMPLATE_PATH = ASSET_PATH / "templates"
+# Local caches (embeddings, ...) are persisted under "./.cache"
+CACHE_PATH = ASSET_PATH.parent / ".cache"
 
 CONFIG = {
     "template": "text_extraction.prompty",
     "separator": "|||",
     "max_chunk_size": 500,
+    # tokens shared by consecutive chunks, tokenizer used to count chunk tokens
+    # ("whitespace" or a tiktoken encoding)
+    "chunk_overlap": 0,
+    "tokenizer": "cl100k_base",
+    # pages sent concurrently to the vision model, and retries per failed page
+    "ocr_max_workers": 4,
+    "ocr_max_retries": 3,
+    "ocr_retry_backoff": 2,
+    # pages rendered per pdf2image call, and peak number of rendered pages in memory
+    "pdf_dpi": 200,
+    "pdf_render_window": 2,
+    "pdf_max_pages_in_memory": 8,
+    # on-disk cache of the vision model output per page, set to None to disable it
+    "ocr_cache": str(CACHE_PATH / "ocr.sqlite"),
+    "ocr_cache_max_entries": 50_000,
     "top_k": 5,
+    # over-fetch `mmr_fetch_k` candidates and keep `top_k` diverse ones by Maximal
+    # Marginal Relevance, dropping candidates more similar than `dedup_threshold`
+    "diversify": False,
+    "mmr_fetch_k": 20,
+    "mmr_lambda": 0.7,
+    "dedup_threshold": 0.95,
     "rag_entities": ["product_name", "manufacturer", "risk_class"],
+    # maximum number of tokens of retrieved context returned to the model
+    "context_token_budget": 2000,
+    # number of chunks sent per embeddings request, and requests kept in flight
+    "embedding_batch_size": 16,
+    "embedding_max_workers": 4,
+    # truncate text-embedding-3-* embeddings to fewer dimensions, None for all of them
+    "embedding_dimensions": None,
+    # on-disk embedding cache, set to None to disable it
+    "embedding_cache": str(CACHE_PATH / "embeddings.sqlite"),
+    "embedding_cache_max_entries": 200_000,
+    # in-process caches of query vectors and search results (ttl in seconds)
+    "query_cache_size": 1024,
+    "query_cache_ttl": 3600,
+    "result_cache_ttl": 300,
+    # retrieve documents for the raw user input while the model runs, and serve them
+    # to rag_retrieve calls whose query has at least `speculation_threshold` word
+    # overlap (Jaccard) with it
+    "speculative_retrieval": False,
+    "speculation_threshold": 0.5,
+    # search index uploads: documents and payload bytes per request, concurrency
+    "upload_batch_size": 1000,
+    "upload_max_bytes": 8_000_000,
+    "upload_max_workers": 4,
+    "upload_max_retries": 3,
+    # ids fetched per search request, local record of the ids of each file
+    "search_page_size": 1000,
+    "manifest_path": str(CACHE_PATH / "manifest.sqlite"),
+    # json ingestion: records embedded per batch, batches waiting to be uploaded, and
+    # directory of the checkpoints of interrupted runs
+    "ingest_batch_size": 256,
+    "ingest_queue_size": 4,
+    "ingest_checkpoint_path": str(CACHE_PATH / "checkpoints"),
+    # index vector storage: element type ("Edm.Single" or "Edm.Half"), compression
+    # (None, "scalar" or "binary") rescored with `vector_oversampling` candidates
+    "vector_storage_type": "Edm.Single",
+    "vector_compression": None,
+    "vector_oversampling": 4.0,
+    # vector search profile of the index, "myHnswProfile" or "myExhaustiveKnnProfile",
+    # and HNSW graph parameters, see src/scripts/benchmark_hnsw.py to tune them
+    "vector_search_profile": "myHnswProfile",
+    "hnsw_parameters": {"m": 4, "ef_construction": 1000, "ef_search": 1000},
+    # "azure" for Azure AI Search, "local" for a local index stored on disk
+    "vector_backend": "azure",
+    "local_index_path": str(CACHE_PATH / "indexes"),
+    # SQL connections: pool size (also the number of query threads), seconds to wait
+    # for a free connection, and idle seconds after which a connection is checked
+    "sql_pool_size": 4,
+    "sql_pool_timeout": 30,
+    "sql_health_check_interval": 60,
+    # fake records inserted by SQLDatabase.setup, per batch, and the number of fake
+    # values of each text column they are sampled from
+    "seed_rows": 1000,
+    "seed_batch_size": 10_000,
+    "seed_pool_size": 1000,
+    # on-disk cache of the discovered database schema, set to None to disable it
+    "schema_cache": str(CACHE_PATH / "schema.json"),
+    # SQL results: rows and bytes of text kept, rows read to count and summarize the
+    # truncated rows, and rows fetched per round trip
+    "sql_max_rows": 100,
+    "sql_max_result_bytes": 8000,
+    "sql_max_scan_rows": 100_000,
+    "sql_fetch_size": 500,
+    # cached SQL results, expiring after `sql_cache_ttl` seconds or when the data
+    # changes. Reading the data version needs the VIEW DATABASE STATE permission.
+    "sql_cache_size": 256,
+    "sql_cache_ttl": 300,
 }
 
 